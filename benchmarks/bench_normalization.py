@@ -0,0 +1,76 @@
+'''
+
+    bench_normalization.py
+
+    Regression benchmark for node name normalization and region inclusion.
+    Times both stages on synthetic workbooks of growing size and fails if
+    run time grows faster than linearly with the number of rows.
+
+    Run from the src/ directory:
+
+        python ../benchmarks/bench_normalization.py
+
+'''
+
+import sys
+import time
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.database import GlobalTransmissionDatabase
+from src.utils import normalize_node_names
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+# max allowed exponent of run time against row count
+MAX_EXPONENT = 1.2
+
+
+def best_of(f, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+
+def main(data_dir='../data'):
+
+    db = GlobalTransmissionDatabase(data_dir=data_dir, use_cache=False)
+    rng = np.random.default_rng(0)
+
+    # raw workbook names, e.g. AFG and CHNXI
+    raw = db.NODES.nodes.str.replace('-XX', '').str.replace('-', '')
+
+    timings = []
+    for n in SIZES:
+        names = pd.Series(raw[rng.integers(0, len(raw), n)])
+
+        # normalization
+        t_normalize = best_of(lambda: normalize_node_names(names))
+
+        # inclusion
+        nodes = normalize_node_names(names)
+        db.DATABASE = pd.DataFrame({
+            'from' : db.NODES.categorical(nodes),
+            'to' : db.NODES.categorical(nodes.sample(frac=1, random_state=0)),
+        })
+        t_include = best_of(db._load_included_regions)
+
+        timings.append(t_normalize + t_include)
+        print(f'{n:>10,} rows  normalize {t_normalize * 1e3:8.1f} ms  include {t_include * 1e3:8.1f} ms')
+
+    exponent = np.polyfit(np.log(SIZES), np.log(timings), 1)[0]
+    print(f'scaling exponent {exponent:.2f} (max {MAX_EXPONENT})')
+
+    return 0 if exponent <= MAX_EXPONENT else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
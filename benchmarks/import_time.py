@@ -0,0 +1,75 @@
+'''
+
+    import_time.py
+
+    Import time benchmark for the package entry points. Imports each module
+    in a fresh interpreter under python -X importtime and fails if it takes
+    longer than its budget or pulls in plotting or geo libraries, which
+    should only load when a plot or spatial table is first used.
+
+    Run from anywhere:
+
+        python benchmarks/import_time.py
+
+'''
+
+import subprocess
+import sys
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# module: budget (ms) for its cumulative import time, median of RUNS
+BUDGETS = {
+    'src.database' : 1000,
+    'src.dataviz' : 1000,
+    'src.export' : 1000,
+}
+RUNS = 5
+
+# libraries that must not load at import time
+DEFERRED = ['plotly', 'matplotlib', 'networkx', 'geopandas', 'shapely', 'scipy', 'openpyxl', 'kaleido']
+
+
+def import_profile(module):
+    '''Cumulative import time (us) of every module loaded by importing module
+    '''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+
+    failed = False
+    for module, budget in BUDGETS.items():
+        runs = [import_profile(module) for _ in range(RUNS)]
+        ms = sorted(r[module] for r in runs)[RUNS // 2] / 1e3
+
+        loaded = sorted({
+            name.split('.')[0] for name in runs[0] if name.split('.')[0] in DEFERRED
+        })
+
+        ok = ms <= budget and not loaded
+        failed |= not ok
+        print(f'{module:<15} {ms:8.1f} ms (budget {budget} ms)  {"ok" if ok else "FAIL"}')
+        if loaded:
+            print(f'{"":<15} imports {", ".join(loaded)} eagerly')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
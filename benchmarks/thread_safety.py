@@ -0,0 +1,87 @@
+'''
+
+    thread_safety.py
+
+    Regression check for loading a shared database from several threads.
+    Starts from a cold database and loads tables directly and through
+    synchronized methods (get_region, get_topology, ...) at once, in both
+    orders, and fails if any thread hangs or raises.
+
+    Run from the src/ directory:
+
+        python ../benchmarks/thread_safety.py
+
+'''
+
+import sys
+import threading
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.database import GlobalTransmissionDatabase
+
+# seconds to wait for all threads before reporting a hang
+TIMEOUT = 300
+
+# (name, call) pairs, started in order a short delay apart
+CALLS = [
+    ('get_region_geometry', lambda db: db.get_region_geometry('Europe')),
+    ('get_region', lambda db: db.get_region('Europe')),
+    ('LINK_GEOMETRY', lambda db: db.LINK_GEOMETRY),
+    ('get_topology', lambda db: db.get_topology(0.1)),
+    ('GEOMETRY', lambda db: db.GEOMETRY),
+    ('get_interregional_capacity', lambda db: db.get_interregional_capacity('region')),
+    ('DATABASE', lambda db: db.DATABASE),
+]
+DELAY = 0.05
+
+
+def run(calls, data_dir):
+    '''Run calls on one cold database in threads, returns the names of the
+    calls that did not finish in time and the errors of those that raised
+    '''
+    db = GlobalTransmissionDatabase(data_dir=data_dir, use_cache=False)
+    errors = {}
+
+    def target(name, call):
+        try:
+            call(db)
+        except Exception as e:
+            errors[name] = e
+
+    threads = []
+    for name, call in calls:
+        threads.append(threading.Thread(target=target, args=(name, call), daemon=True))
+        threads[-1].start()
+        time.sleep(DELAY)
+
+    deadline = time.monotonic() + TIMEOUT
+    for t in threads:
+        t.join(max(deadline - time.monotonic(), 0))
+
+    hung = [name for (name, _), t in zip(calls, threads) if t.is_alive()]
+    return hung, errors
+
+
+def main(data_dir='../data'):
+
+    failed = False
+    for label, calls in [('forward', CALLS), ('reverse', CALLS[::-1])]:
+        t = time.monotonic()
+        hung, errors = run(calls, data_dir)
+        ok = not hung and not errors
+        failed |= not ok
+        print(f'{label:<8} {time.monotonic() - t:8.1f} s  {"ok" if ok else "FAIL"}')
+        if hung:
+            print(f'{"":<8} hung: {", ".join(hung)}')
+        for name, e in errors.items():
+            print(f'{"":<8} {name}: {type(e).__name__}: {e}')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
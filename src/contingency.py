@@ -0,0 +1,146 @@
+'''
+
+    contingency.py
+
+    N-1 / N-k contingency analysis of interregional transfer capability
+
+'''
+
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+
+from .transfer import TransferCapability, solve_max_flow
+
+
+# per process state of pool workers, set once by _init_worker
+_WORKER = {}
+
+
+def _init_worker(capacity, members, pairs):
+    _WORKER['capacity'] = capacity
+    _WORKER['members'] = members
+    _WORKER['pairs'] = pairs
+
+
+def _solve_case(positions):
+    '''Transfers between all pairs with the capacity entries at positions of
+    the shared capacity matrix removed
+    '''
+    base, members = _WORKER['capacity'], _WORKER['members']
+    capacity = base.copy()
+    capacity.data[positions] = 0
+    capacity.eliminate_zeros()
+    return [solve_max_flow(capacity, members[a], members[b]) for a, b in _WORKER['pairs']]
+
+
+def contingency_analysis(
+        transfer : TransferCapability,
+        mapping='subregion',
+        k=1,
+        samples=None,
+        pairs=None,
+        cross_border_only=True,
+        workers=None,
+        chunksize=8,
+        seed=0,
+) -> tuple:
+    '''Loss of zone to zone transfer capability when links are taken out
+
+    Each case removes k links (both directions of a node pair) and recomputes
+    the max-flow transfer between zone pairs of mapping, see
+    network.zone_codes. With k=1 every link is a case (N-1); for k > 1,
+    samples random combinations of k links are drawn (N-k).
+
+    pairs: (from zone, to zone) tuples, defaults to the zone pairs with a
+    direct link. Cases run in a process pool sharing the read-only capacity
+    matrix through the pool initializer; workers=1 runs in this process.
+
+    Returns a ranking of cases by total transfer lost, and the transfer of
+    every pair per case (the 'base' row has no outage).
+    '''
+    capacity = transfer.capacity
+    nodes = transfer.network.nodes
+    n = capacity.shape[0]
+
+    codes, labels, _ = transfer.zoning(mapping)
+    members = [np.flatnonzero(codes == z) for z in range(len(labels))]
+
+    # zone pairs, default to directly linked zones
+    if pairs is None:
+        m = capacity.tocoo()
+        zf, zt = codes[m.row], codes[m.col]
+        linked = (zf >= 0) & (zt >= 0) & (zf != zt)
+        ids = sorted(set(zip(zf[linked].tolist(), zt[linked].tolist())))
+    else:
+        ids = [(transfer.zone_code(labels, a, mapping), transfer.zone_code(labels, b, mapping)) for a, b in pairs]
+    if not ids:
+        raise ValueError('No zone pairs to evaluate')
+
+    # candidate links as unordered node pairs
+    links = sparse.triu(capacity + capacity.T, k=1).tocoo()
+    i, j = links.row, links.col
+    if cross_border_only:
+        keep = nodes.iso[i] != nodes.iso[j]
+        i, j = i[keep], j[keep]
+
+    # positions of both directions of each link in the capacity data
+    keys = np.repeat(np.arange(n), np.diff(capacity.indptr)) * n + capacity.indices
+    def positions(a, b):
+        wanted = np.array([a * n + b, b * n + a])
+        loc = np.searchsorted(keys, wanted).clip(max=len(keys) - 1)
+        return loc[keys[loc] == wanted]
+
+    # cases
+    if k == 1:
+        cases = [(l,) for l in range(len(i))]
+    else:
+        if not samples:
+            raise ValueError('samples is required for k > 1')
+        rng = np.random.default_rng(seed)
+        cases = sorted({tuple(sorted(rng.choice(len(i), size=k, replace=False).tolist())) for _ in range(samples)})
+
+    case_positions = [np.array([], dtype=int)] + [
+        np.concatenate([positions(i[l], j[l]) for l in case]) for case in cases
+    ]
+    case_labels = ['base'] + [
+        ' + '.join(f'{nodes.node[i[l]]}/{nodes.node[j[l]]}' for l in case) for case in cases
+    ]
+
+    # run cases
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(capacity, members, ids)
+        values = [_solve_case(p) for p in case_positions]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(capacity, members, ids),
+        ) as pool:
+            values = list(pool.map(_solve_case, case_positions, chunksize=chunksize))
+
+    transfers = pd.DataFrame(
+        values,
+        index=pd.Index(case_labels, name='links'),
+        columns=pd.MultiIndex.from_tuples([(labels[a], labels[b]) for a, b in ids], names=['from','to']),
+    )
+
+    # rank cases by transfer lost against the base case
+    loss = transfers.iloc[0] - transfers.iloc[1:]
+    worst = [transfers.columns[w] if l > 0 else (None, None) for w, l in zip(
+        loss.to_numpy().argmax(axis=1), loss.max(axis=1),
+    )]
+    ranking = pd.DataFrame({
+        'total_loss' : loss.sum(axis=1),
+        'max_loss' : loss.max(axis=1),
+        'worst_from' : [w[0] for w in worst],
+        'worst_to' : [w[1] for w in worst],
+    }).sort_values(['total_loss','max_loss'], ascending=False)
+
+    return ranking, transfers
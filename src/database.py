@@ -6,201 +6,729 @@
 
 '''
 
-import os
+import functools
+import hashlib
+import threading
+import warnings
 
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-import geopandas as gpd
 
-from shapely.geometry import Point
+from .nodes import NodeRegistry
+from .utils import hash_files, normalize_node_names, write_atomic
+
+
+# source files each processed table is derived from, relative to data_dir.
+# tables are loaded lazily on first access; the attribute accessed inside each
+# _load_* method forms the dependency graph between tables:
+#
+#   NODES               <- _node_attributes <- _nodes, _iso_codes
+#   DATABASE            <- workbook, NODES
+#   INCLUDED_REGIONS    <- DATABASE, _iso_codes
+#   CENTRE_POINTS       <- _node_attributes
+#   POPULATION_CENTRES  <- _node_attributes
+#   GEOMETRY            <- world shapefile, _iso_codes, NODES
+#   SIMPLIFIED_GEOMETRY <- GEOMETRY
+#   LINK_GEOMETRY       <- DATABASE, NODES
+#   PATHWAYS            <- LINK_GEOMETRY, GEOMETRY
+#
+TABLE_SOURCES = {
+    'DATABASE' : ['global_transmission_data.xlsx', 'csv/nodes.csv', 'csv/iso_codes.csv'],
+    'INCLUDED_REGIONS' : ['global_transmission_data.xlsx', 'csv/nodes.csv', 'csv/iso_codes.csv'],
+    'CENTRE_POINTS' : ['csv/nodes.csv', 'csv/iso_codes.csv'],
+    'POPULATION_CENTRES' : ['csv/nodes.csv', 'csv/iso_codes.csv'],
+    'GEOMETRY' : ['shapefiles/world/world.*', 'csv/nodes.csv', 'csv/iso_codes.csv'],
+    'SIMPLIFIED_GEOMETRY' : ['shapefiles/world/world.*', 'csv/nodes.csv', 'csv/iso_codes.csv'],
+    'LINK_GEOMETRY' : ['global_transmission_data.xlsx', 'csv/nodes.csv', 'csv/iso_codes.csv'],
+    'PATHWAYS' : ['global_transmission_data.xlsx', 'shapefiles/world/world.*', 'csv/nodes.csv', 'csv/iso_codes.csv'],
+}
+TABLES = list(TABLE_SOURCES)
+GEO_TABLES = ['CENTRE_POINTS', 'POPULATION_CENTRES', 'GEOMETRY', 'SIMPLIFIED_GEOMETRY', 'LINK_GEOMETRY']
+
+# bump when the processing below changes so stale caches are not reused
+CACHE_VERSION = 4
+
+# columns read from the first sheet of the workbook, in output order, as
+# (header, occurrence of that header, column name, dtype). Headers repeat
+# between the existing and planned blocks, hence the occurrence.
+WORKBOOK_HEADER_ROW = 2
+WORKBOOK_SCHEMA = [
+    ('From', 0, 'From', 'str'),
+    ('To', 0, 'To', 'str'),
+    ('CAP (MW) +', 0, 'Existing Capacity + (MW)', 'float64'),
+    ('Cap (MW) -', 0, 'Existing Capacity - (MW)', 'float64'),
+    ('Cap (MW) +', 0, 'Planned Capacity + (MW)', 'float64'),
+    ('Cap (MW) -', 1, 'Planned Capacity - (MW)', 'float64'),
+    ('Year Planned', 0, 'Year Planned', 'float64'),
+    ('Assumptions/Applied methods', 0, 'Assumptions/Applied methods', 'str'),
+    ('Other Notes', 0, 'Other Notes', 'str'),
+    ('Source Existing (2023)', 0, 'Source Existing (2023)', 'str'),
+    ('Source Planned', 0, 'Source Planned', 'str'),
+]
+
+
+def read_workbook(
+        path,
+        schema=WORKBOOK_SCHEMA,
+        header_row=WORKBOOK_HEADER_ROW,
+):
+    '''Stream the columns in schema from the first sheet of the workbook
+
+    The sheet is read row by row in openpyxl read-only mode, keeping only the
+    projected columns, so unused columns are never materialised. Rows without
+    a From node (e.g. trailing blank rows) are skipped.
+    '''
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+
+        # locate projected columns from the header row
+        header = next(ws.iter_rows(min_row=header_row, max_row=header_row, values_only=True))
+        positions = {}
+        for i, h in enumerate(header):
+            n = 0
+            while (h, n) in positions:
+                n += 1
+            positions[(h, n)] = i
+
+        missing = [(h, n) for h, n, _, _ in schema if (h, n) not in positions]
+        if missing:
+            raise ValueError(f'Columns {missing} not found in {path}')
+
+        # only parse the span of columns we need
+        idx = [positions[(h, n)] for h, n, _, _ in schema]
+        first = min(idx)
+        idx = [i - first for i in idx]
+        from_idx = positions[('From', 0)] - first
+
+        values = [[] for _ in schema]
+        for row in ws.iter_rows(
+            min_row=header_row + 1,
+            min_col=first + 1,
+            max_col=first + max(idx) + 1,
+            values_only=True,
+        ):
+            if row[from_idx] is None:
+                continue
+            for v, i in zip(values, idx):
+                v.append(row[i])
+    finally:
+        wb.close()
+
+    return pd.DataFrame({
+        name : pd.Series(v, dtype=dtype if dtype != 'str' else None)
+        for v, (_, _, name, dtype) in zip(values, schema)
+    })
+
+
+# process-wide shared databases by (resolved data_dir, use_cache, data_version),
+# see GlobalTransmissionDatabase.shared
+_SHARED = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def _synchronized(method):
+    '''Run a method under the instance lock, so threads sharing a database
+    load each table and derived object once
+    '''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class GlobalTransmissionDatabase:
     '''Gets all files from: data/global_transmission_database.csv
+
+    Tables are loaded on first access and memoized, so callers that only need
+    capacities never read the shapefile or import geopandas. Each processed
+    table is also cached as data/cache/<TABLE>-<hash>.parquet, where the hash
+    covers the table's source files, so warm starts skip parsing the workbook
+    and shapefile.
+
+    Use GlobalTransmissionDatabase.shared() to reuse one loaded instance per
+    data directory across a process; loading is thread safe.
     '''
     def __init__(
         self,
+        data_dir='../data',
+        use_cache=True,
     ):
 
-        # read nodes
-        self._nodes = pd.read_csv(
-            '../data/csv/nodes.csv'
+        self.data_dir = Path(data_dir)
+        self.cache_dir = self.data_dir / 'cache'
+        self.use_cache = use_cache
+
+        # capacity roll-ups by aggregation level, see get_interregional_capacity,
+        # and other objects derived from the capacity cube
+        self._capacity_cube = None
+        self._capacity_rollups = {}
+        self._derived = {}
+
+        # spatial indexes over GEOMETRY, see get_node_locator
+        self._spatial = {}
+
+        # loaded tables, guarded by the instance lock
+        self._tables = {}
+
+        # bumped when DATABASE is replaced or edited, see database_version
+        self._generation = 0
+        self._database_version = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def shared(
+        cls,
+        data_dir='../data',
+        use_cache=True,
+    ):
+        '''Process-wide instance for a data directory
+
+        Instances are keyed by the resolved data_dir and the data version, so
+        callers share one loaded dataset until the source files change, when
+        a new instance replaces the stale one.
+        '''
+        db = cls(data_dir, use_cache)
+        directory = str(Path(data_dir).resolve())
+        key = (directory, use_cache, db.data_version)
+        with _SHARED_LOCK:
+            if key not in _SHARED:
+                for stale in [k for k in _SHARED if k[:2] == key[:2]]:
+                    del _SHARED[stale]
+                _SHARED[key] = db
+            return _SHARED[key]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_lock')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    ##################
+    # CACHE
+    ##################
+
+    def _source_files(self, table=None):
+        '''Source files of a table, or of all tables
+        '''
+        patterns = TABLE_SOURCES[table] if table else sorted(set(sum(TABLE_SOURCES.values(), [])))
+        files = []
+        for p in patterns:
+            files += sorted(self.data_dir.glob(p)) if '*' in p else [self.data_dir / p]
+        return files
+
+    def _table_version(self, table):
+        '''Content hash of the source files of a table
+        '''
+        return hash_files(self._source_files(table), salt=f'{table}-v{CACHE_VERSION}')
+
+    @property
+    def data_version(self):
+        '''Content hash of all source files
+        '''
+        return self._memoized('data_version', lambda: hash_files(self._source_files(), salt=f'v{CACHE_VERSION}'))
+
+    @property
+    def database_version(self):
+        '''Version of DATABASE: data_version while it is as loaded, else a
+        content hash, recomputed after DATABASE is replaced or
+        clear_capacity_cache is called
+        '''
+        with self._lock:
+            if self._generation == 0:
+                return self.data_version
+            if self._database_version is None or self._database_version[0] != self._generation:
+                rows = pd.util.hash_pandas_object(self.DATABASE, index=True).to_numpy()
+                self._database_version = (self._generation, hashlib.sha256(rows.tobytes()).hexdigest()[:16])
+            return self._database_version[1]
+
+    @_synchronized
+    def _memoized(self, name, build):
+        '''Build an object once per instance
+
+        Tables and inputs are plain properties memoized here rather than
+        cached_property, whose per-attribute lock (Python <= 3.11) taken
+        before the instance lock deadlocks against synchronized methods
+        that take the instance lock first and then load a table.
+        '''
+        if name not in self._tables:
+            self._tables[name] = build()
+        return self._tables[name]
+
+    def _cached_table(self, table, load):
+        '''Load a table once per instance, see _read_or_build
+        '''
+        return self._memoized(table, lambda: self._read_or_build(table, load))
+
+    def _read_or_build(self, table, load):
+        '''Read a table from the cache, or build it with load() and cache it
+        '''
+        if not self.use_cache:
+            return load()
+
+        path = self.cache_dir / f'{table}-{self._table_version(table)}.parquet'
+
+        if path.is_file():
+            try:
+                if table in GEO_TABLES:
+                    import geopandas as gpd
+                    return gpd.read_parquet(path)
+                return pd.read_parquet(path)
+            except (OSError, ValueError) as e:
+                warnings.warn(f'Ignoring unreadable cache file {path}: {e}')
+
+        df = load()
+
+        write_atomic(path, df.to_parquet, stale=f'{table}-*.parquet')
+
+        return df
+
+    ##################
+    # RAW INPUTS
+    ##################
+
+    @property
+    def _nodes(self):
+        return self._memoized('_nodes', lambda: pd.read_csv(
+            self.data_dir / 'csv' / 'nodes.csv'
+        ))
+
+    @property
+    def _iso_codes(self):
+        return self._memoized('_iso_codes', lambda: pd.read_csv(
+            self.data_dir / 'csv' / 'iso_codes.csv'
+        ))
+
+    @property
+    def _node_attributes(self):
+        '''Plain node table with regions, used where geometry is not needed
+        '''
+        return self._memoized('_node_attributes', self._load_node_attributes)
+
+    @property
+    def NODES(self):
+        '''Registry of node ids; DATABASE from/to codes index into it
+        '''
+        return self._memoized('NODES', lambda: NodeRegistry(self._node_attributes))
+
+    def _load_node_attributes(self):
+        nodes = self._nodes.copy()
+        nodes['region'] = nodes.iso.map( self._iso_codes.set_index('alpha-3')['region'].to_dict() )
+        nodes['subregion'] = nodes.iso.map( self._iso_codes.set_index('alpha-3')['sub-region'].to_dict() )
+        nodes.columns = [i.lower() for i in nodes.columns]
+        return nodes
+
+    ##################
+    # TABLES
+    ##################
+
+    @property
+    def DATABASE(self):
+        return self._cached_table('DATABASE', self._load_database)
+
+    @DATABASE.setter
+    def DATABASE(self, df):
+        with self._lock:
+            self._tables['DATABASE'] = df
+            self._generation += 1
+
+    @property
+    def INCLUDED_REGIONS(self):
+        return self._cached_table('INCLUDED_REGIONS', self._load_included_regions)
+
+    @property
+    def CENTRE_POINTS(self):
+        return self._cached_table('CENTRE_POINTS', self._load_centre_points)
+
+    @property
+    def POPULATION_CENTRES(self):
+        return self._cached_table('POPULATION_CENTRES', self._load_population_centres)
+
+    @property
+    def GEOMETRY(self):
+        return self._cached_table('GEOMETRY', self._load_geometry)
+
+    @property
+    def SIMPLIFIED_GEOMETRY(self):
+        '''GEOMETRY simplified at each of geometry.SIMPLIFY_TOLERANCES, see
+        get_geometry
+        '''
+        return self._cached_table('SIMPLIFIED_GEOMETRY', self._load_simplified_geometry)
+
+    @property
+    def LINK_GEOMETRY(self):
+        '''Great-circle length and geometry of every linked node pair, see
+        geometry.link_geometry
+        '''
+        return self._cached_table('LINK_GEOMETRY', self._load_link_geometry)
+
+    @property
+    def PATHWAYS(self):
+        '''Land or subsea pathway and subsea length of every linked node
+        pair, see spatial.classify_pathways
+        '''
+        return self._cached_table('PATHWAYS', self._load_pathways)
+
+    ##################
+    # PROCESS
+    ##################
+
+    def _load_database(self):
+
+        # read database
+        df = read_workbook(
+            self.data_dir / 'global_transmission_data.xlsx',
         )
 
-        # read iso codes
-        self._iso_codes = pd.read_csv(
-            '../data/csv/iso_codes.csv'
+        # fix node names
+        for c in ['From','To']:
+            df[c] = normalize_node_names(df[c])
+
+        # store nodes as categoricals whose codes are registry ids
+        for c in ['From','To']:
+            unknown = set(df[c].dropna()) - set(self.NODES.nodes)
+            if unknown:
+                warnings.warn(f'Nodes {sorted(unknown)} in {c} are not in nodes.csv and will be ignored')
+            df[c] = self.NODES.categorical(df[c])
+
+        # make column names lower case
+        df.columns = [i.lower() for i in df.columns]
+
+        return df
+
+    def _load_included_regions(self):
+
+        database = self.DATABASE
+
+        # read exclusion zones
+        codes = np.concatenate([database['from'].cat.codes, database['to'].cat.codes])
+        used = np.bincount(codes[codes >= 0], minlength=len(self.NODES)) > 0
+        regions = self.NODES.iso[used]
+        included_regions = self._iso_codes[['name','alpha-3','region','sub-region']].copy()
+        included_regions['Included'] = np.where(included_regions['alpha-3'].isin(regions), 'True', 'False')
+
+        return included_regions
+
+    def _load_centre_points(self):
+        import geopandas as gpd
+
+        nodes = self._node_attributes
+
+        # convert to geo_df
+        return gpd.GeoDataFrame(
+            nodes[['node','node_verbose','country','region','subregion']],
+            crs="EPSG:4326",
+            geometry=gpd.points_from_xy(nodes.centroid_lon, nodes.centroid_lat),
         )
 
-        # read database
-        self.DATABASE = pd.read_excel(
-            '../data/global_transmission_data.xlsx',
-            skiprows=1,
+    def _load_population_centres(self):
+        import geopandas as gpd
+
+        nodes = self._node_attributes
+
+        # convert to geo_df
+        return gpd.GeoDataFrame(
+            nodes[['node','node_verbose','country','region','subregion','population']],
+            crs="EPSG:4326",
+            geometry=gpd.points_from_xy(nodes.pop_lon, nodes.pop_lat),
         )
-        
-        # read geometry 
-        self.GEOMETRY = gpd.read_file(
-            '../data/shapefiles/world/world.shp').rename(
+
+    def _load_geometry(self):
+        import geopandas as gpd
+
+        # read geometry
+        geometry = gpd.read_file(
+            self.data_dir / 'shapefiles' / 'world' / 'world.shp').rename(
                 columns={
                     "region":"REGION",
                     "subregion":"SUBREGION"
                 }
             )
 
-        ##################
-        # PROCESS
-        ##################
+        geometry["iso_region"] = geometry.REGION.map(
+            self._iso_codes.set_index("alpha-3").to_dict()["region"])
+        geometry["iso_subregion"] = geometry.REGION.map(
+            self._iso_codes.set_index("alpha-3").to_dict()["sub-region"])
+        
+        geometry["node"] = geometry.apply(lambda row: f"{row.REGION}-{row.SUBREGION}", axis=1)
+        geometry = geometry.set_index("node")
 
-        # --
-        # CENTRE_POINTS
-        self.CENTRE_POINTS = self._nodes.copy()
+        # registry ids, -1 for shapes without a node
+        geometry["node_id"] = self.NODES.ids(geometry.index, strict=False)
 
-        # map regions
-        self.CENTRE_POINTS['region'] = self.CENTRE_POINTS.iso.map( self._iso_codes.set_index('alpha-3')['region'].to_dict() )
-        self.CENTRE_POINTS['subregion'] = self.CENTRE_POINTS.iso.map( self._iso_codes.set_index('alpha-3')['sub-region'].to_dict() )
+        return geometry
 
-        # convert to geo_df
-        geometry = [Point(xy) for xy in zip(self.CENTRE_POINTS.Centroid_Lon, self.CENTRE_POINTS.Centroid_Lat)]
-        self.CENTRE_POINTS = self.CENTRE_POINTS.drop(['Centroid_Lon', 'Centroid_Lat'], axis=1)
-        self.CENTRE_POINTS = gpd.GeoDataFrame(self.CENTRE_POINTS, crs="EPSG:4326", geometry=geometry)
+    def _load_simplified_geometry(self):
+        from .geometry import simplify_geometry
 
-        # column name
-        self.CENTRE_POINTS.columns = [i.lower() for i in self.CENTRE_POINTS.columns]
+        return simplify_geometry(self.GEOMETRY)
 
-        # reorder
-        self.CENTRE_POINTS = self.CENTRE_POINTS[['node','node_verbose','country','region','subregion','geometry']]
+    def _load_link_geometry(self):
+        from .geometry import link_geometry
 
-        # --
-        # POPULATION_CENTRES
-        self.POPULATION_CENTRES = self._nodes.copy()
+        return link_geometry(self.NODES, self.DATABASE)
 
-        # map regions
-        self.POPULATION_CENTRES['region'] = self.POPULATION_CENTRES.iso.map( self._iso_codes.set_index('alpha-3')['region'].to_dict() )
-        self.POPULATION_CENTRES['subregion'] = self.POPULATION_CENTRES.iso.map( self._iso_codes.set_index('alpha-3')['sub-region'].to_dict() )
+    def _load_pathways(self):
+        from .spatial import classify_pathways
 
-        # convert to geo_df
-        geometry = [Point(xy) for xy in zip(self.POPULATION_CENTRES.Pop_Lon, self.POPULATION_CENTRES.Pop_Lat)]
-        self.POPULATION_CENTRES = self.POPULATION_CENTRES.drop(['Pop_Lon', 'Pop_Lat'], axis=1)
-        self.POPULATION_CENTRES = gpd.GeoDataFrame(self.POPULATION_CENTRES, crs="EPSG:4326", geometry=geometry)
+        return classify_pathways(self.LINK_GEOMETRY, self.GEOMETRY)
 
-        # column name
-        self.POPULATION_CENTRES.columns = [i.lower() for i in self.POPULATION_CENTRES.columns]
+    def get_geometry(self, tolerance=None, width=None):
+        '''Node geometry at a level of the simplification pyramid
 
-        # reorder
-        self.POPULATION_CENTRES = self.POPULATION_CENTRES[['node','node_verbose','country','region','subregion','population','geometry']]
+        tolerance: one of geometry.SIMPLIFY_TOLERANCES, or None for full
+        resolution GEOMETRY
+        width: figure width (px) to pick the tolerance from instead
+        '''
+        from .geometry import SIMPLIFY_TOLERANCES, pick_tolerance
 
-        # --
-        # DATABASE
+        if width is not None:
+            tolerance = pick_tolerance(width)
+        if tolerance is None:
+            return self.GEOMETRY
+        if tolerance not in SIMPLIFY_TOLERANCES:
+            raise ValueError(f'Unknown tolerance {tolerance}, expected one of {SIMPLIFY_TOLERANCES}')
 
-        # fix node names
-        for c in ['From','To']:
+        pyramid = self.SIMPLIFIED_GEOMETRY
+        return pyramid[pyramid['tolerance'] == tolerance].drop(columns='tolerance')
 
-            self.DATABASE.loc[
-                self.DATABASE[c].str.len() > 3, c
-            ] = self.DATABASE.loc[
-                    self.DATABASE[c].str.len() > 3, c
-                    ].str[0:3] + '-' + self.DATABASE.loc[
-                                self.DATABASE[c].str.len() > 3, c
-                                ].str[3:6]
-
-            self.DATABASE.loc[
-                self.DATABASE[c].str.len() == 3, c
-            ] = self.DATABASE.loc[
-                    self.DATABASE[c].str.len() == 3, c
-                    ] + '-' + 'XX'
-        
-        # change column names
-        self.DATABASE['Existing Capacity + (MW)'] = self.DATABASE['CAP (MW) +']
-        self.DATABASE['Existing Capacity - (MW)'] = self.DATABASE['Cap (MW) -']
-        self.DATABASE['Planned Capacity + (MW)']  = self.DATABASE['Cap (MW) +']
-        self.DATABASE['Planned Capacity - (MW)']  = self.DATABASE['Cap (MW) -.1']
-        
-        # drop some columns we don't need
-        self.DATABASE = self.DATABASE.drop(
-            [
-            'Comments', 
-            'Name', 
-            'Name.1', 
-            'Completed?', 
-            'Reviewed?', 
-            'Technology',
-            #'From', 
-            #'To', 
-            'CAP (MW) +', 
-            'Cap (MW) -', 
-            'Voltage (kV)',
-            'Distance (KM)', 
-            'Cap (MW) +', 
-            'Cap (MW) -.1', 
-            'Voltage (kV) +',
-            'Distance (KM).1', 
-            #'Year Planned', 
-            #'Source Existing (2023)',
-            'Source2 Existing (2023)', 
-            #'Source Planned', 
-            'Source2 Planned',
-            #'Assumptions/Applied methods', 
-            #'Other Notes', 
-            'Unnamed: 23'
-            ],
-            axis = 1,
-        )
+    @_synchronized
+    def get_topology(self, tolerance=None, quantization=None):
+        '''GEOMETRY (see get_geometry) as a TopoJSON topology with shared
+        borders stored once, see topology.to_topojson; memoized per level
+
+        quantization: grid size over the bounding box, defaults to the
+        coordinate grid of simplified levels, or 1e5 steps at full resolution
+        '''
+        from .geometry import grid_precision
+        from .topology import to_topojson
+
+        key = ('topology', tolerance, quantization)
+        if key not in self._spatial:
+            geometry = self.get_geometry(tolerance)
+            step = None
+            if quantization is None and tolerance is not None:
+                step = 10.0 ** -grid_precision(tolerance)
+            self._spatial[key] = to_topojson(
+                geometry.geometry,
+                geometry[['REGION','SUBREGION','iso_region','iso_subregion']],
+                quantization=quantization or 100_000,
+                step=step,
+            )
+        return self._spatial[key]
 
-        # reorder columns
-        self.DATABASE = self.DATABASE[[
-            'From',
-            'To',
-            'Existing Capacity + (MW)',
-            'Existing Capacity - (MW)',
-            'Planned Capacity + (MW)',
-            'Planned Capacity - (MW)',
-            'Year Planned',
-            'Assumptions/Applied methods',
-            'Other Notes',
-            'Source Existing (2023)',
-            'Source Planned',
-        ]]
+    def export_topojson(self, path, tolerance=None, quantization=None):
+        '''Write node geometry as a TopoJSON file
+        '''
+        from .topology import write_topojson
 
-        # make column names lower case
-        self.DATABASE.columns = [i.lower() for i in self.DATABASE.columns]
+        write_topojson(self.get_topology(tolerance, quantization), path)
 
-        # read exclusion zones
-        regions = list(set( self.DATABASE['from'].str[0:3].unique().tolist() + self.DATABASE['to'].str[0:3].unique().tolist() ))
-        included_regions = self._iso_codes[['name','alpha-3','region','sub-region']].copy()
+    @_synchronized
+    def get_region(self, name):
+        '''Points, links and box of a snapshot region, see
+        regions.regional_subset; built once per DATABASE version
+        '''
+        from .regions import regional_subset
 
-        for i in included_regions['alpha-3']:
-            if i in regions:
-                included_regions.loc[
-                    included_regions['alpha-3'] == i, 'Included'
-                ] = 'True'
-            else:
-                included_regions.loc[
-                    included_regions['alpha-3'] == i, 'Included'
-                ] = 'False'
-
-        self.INCLUDED_REGIONS = included_regions
-        
-        # --
-        # GEOMETRY
-        self.GEOMETRY["iso_region"] = self.GEOMETRY.REGION.map(
-            self._iso_codes.set_index("alpha-3").to_dict()["region"])
-        self.GEOMETRY["iso_subregion"] = self.GEOMETRY.REGION.map(
-            self._iso_codes.set_index("alpha-3").to_dict()["sub-region"])
-        
-        self.GEOMETRY["node"] = self.GEOMETRY.apply(lambda row: f"{row.REGION}-{row.SUBREGION}", axis=1)
-        self.GEOMETRY = self.GEOMETRY.set_index("node")
+        key = ('region', name, self.database_version)
+        if key not in self._spatial:
+            self._spatial[key] = regional_subset(self, name)
+        return self._spatial[key]
+
+    @_synchronized
+    def get_region_geometry(self, name, tolerance=None):
+        '''Node geometry of a snapshot region clipped to its box, see
+        regions.regional_geometry; built once per level
+        '''
+        from .regions import regional_geometry
+
+        key = ('region_geometry', name, tolerance)
+        if key not in self._spatial:
+            self._spatial[key] = regional_geometry(self, name, tolerance)
+        return self._spatial[key]
+
+    ##################
+    # CAPACITIES
+    ##################
+
+    @_synchronized
+    def clear_capacity_cache(self):
+        '''Drop cached capacity roll-ups, needed after editing DATABASE in place
+        '''
+        self._generation += 1
+        self._capacity_cube = None
+        self._capacity_rollups = {}
+        self._derived = {}
+
+    @_synchronized
+    def _node_capacity_cube(self):
+        '''Capacities summed by (from, to) registry id, the base of all roll-ups
+
+        Rebuilt, and roll-ups dropped, when DATABASE is replaced.
+        '''
+        df = self.DATABASE
+        if self._capacity_cube is not None and self._capacity_cube[0] is df:
+            return self._capacity_cube[1]
+
+        f = df['from'].cat.codes.to_numpy()
+        t = df['to'].cat.codes.to_numpy()
+        valid = (f >= 0) & (t >= 0)
+        cube = df.loc[valid, [c for c in df.columns if 'capacity' in c]].groupby(
+            [f[valid], t[valid]]
+        ).sum()
+        cube.index.names = ['from','to']
+
+        self._capacity_cube = (df, cube)
+        self._capacity_rollups = {}
+        self._derived = {}
+        return cube
+
+    @_synchronized
+    def get_network(self):
+        '''Sparse capacity matrices of the network, see network.TransmissionNetwork
+        '''
+        from .network import TransmissionNetwork
+
+        cube = self._node_capacity_cube()
+        if 'network' not in self._derived:
+            self._derived['network'] = TransmissionNetwork(self.NODES, cube)
+        return self._derived['network']
+
+    @_synchronized
+    def get_widest_paths(self, status='existing'):
+        '''All-pairs widest paths, see paths.WidestPaths, memoized per status
+        '''
+        from .paths import WidestPaths
+
+        network = self.get_network()
+        if ('widest_paths', status) not in self._derived:
+            self._derived[('widest_paths', status)] = WidestPaths(network, status)
+        return self._derived[('widest_paths', status)]
+
+    @_synchronized
+    def get_transfer_capability(self, status='existing'):
+        '''Max-flow transfer capability engine, see transfer.TransferCapability
+
+        Memoized per status so its cached results are reused across calls.
+        '''
+        from .transfer import TransferCapability
+
+        network = self.get_network()
+        if ('transfer', status) not in self._derived:
+            self._derived[('transfer', status)] = TransferCapability(network, status)
+        return self._derived[('transfer', status)]
+
+    @_synchronized
+    def get_capacity_timeline(self, start=2023, horizon=2050, undated_year=None):
+        '''Capacity of every link per year, see timeline.CapacityTimeline
+
+        Memoized per (start, horizon, undated_year) so its per-year zone
+        aggregations are reused across calls.
+        '''
+        from .timeline import CapacityTimeline
 
+        self._node_capacity_cube()
+        key = ('timeline', start, horizon, undated_year)
+        if key not in self._derived:
+            self._derived[key] = CapacityTimeline(self, start, horizon, undated_year)
+        return self._derived[key]
+
+    @_synchronized
     def get_interregional_capacity(self,by='subregion'):
         '''Get total capacities (existing and planned) between regions
+
+        by: any NodeRegistry attribute, e.g. 'node', 'country', 'region' or
+        'subregion'. Results are rolled up from a node level capacity cube and
+        memoized per level, so repeated calls do not touch DATABASE.
         '''
-        # copy database
-        df = self.DATABASE.copy()
-        # map region onto nodes
-        df['from'] = df['from'].map( self.CENTRE_POINTS.set_index('node')[by].to_dict() )
-        df['to'] = df['to'].map( self.CENTRE_POINTS.set_index('node')[by].to_dict() )
-        # return sums between different regions
-        df = df[df['from'] != df['to']].groupby(by=['from','to']).sum(numeric_only=True).drop('year planned',axis=1)
-        # get max of +/- capacity
-        for f in ['existing','planned']:
-            df[f] = df.filter(regex=f).abs().max(axis=1)
+        cube = self._node_capacity_cube()
+
+        if by not in self._capacity_rollups:
+            # map region onto nodes through registry ids
+            df = cube.reset_index(drop=True)
+            df['from'] = self.NODES.take(by, cube.index.get_level_values('from'))
+            df['to'] = self.NODES.take(by, cube.index.get_level_values('to'))
+            # return sums between different regions
+            df = df[df['from'] != df['to']].groupby(by=['from','to']).sum()
+            # get max of +/- capacity
+            for f in ['existing','planned']:
+                df[f] = df.filter(regex=f).abs().max(axis=1)
+            self._capacity_rollups[by] = df[['existing','planned']]
+
         # return resulting df
-        return df[['existing','planned']]
\ No newline at end of file
+        return self._capacity_rollups[by].copy()
+
+    ##################
+    # SPATIAL
+    ##################
+
+    @_synchronized
+    def get_node_locator(self):
+        '''Point to node lookup over GEOMETRY, see spatial.NodeLocator
+
+        Built once per database so its STRtree is reused across calls.
+        '''
+        from .spatial import NodeLocator
+
+        if 'locator' not in self._spatial:
+            self._spatial['locator'] = NodeLocator(self.NODES, self.GEOMETRY)
+        return self._spatial['locator']
+
+    def locate(self, lon, lat, **kwargs):
+        '''Registry ids of the nodes containing the points, see NodeLocator.locate
+        '''
+        return self.get_node_locator().locate(lon, lat, **kwargs)
+
+    @_synchronized
+    def get_border_adjacency(self):
+        '''Shared border lengths (km) between nodes as a sparse matrix aligned
+        with NODES, see spatial.border_adjacency
+
+        Cached as data/cache/ADJACENCY-<hash>.npz, where the hash is that of
+        GEOMETRY and so covers the shapefile.
+        '''
+        from scipy import sparse
+        from .spatial import border_adjacency
+
+        if 'adjacency' in self._spatial:
+            return self._spatial['adjacency']
+
+        load = lambda: border_adjacency(self.NODES, self.GEOMETRY).tocsr()
+        if not self.use_cache:
+            self._spatial['adjacency'] = load()
+            return self._spatial['adjacency']
+
+        path = self.cache_dir / f'ADJACENCY-{self._table_version("GEOMETRY")}.npz'
+        adjacency = None
+        if path.is_file():
+            try:
+                adjacency = sparse.load_npz(path).tocsr()
+            except (OSError, ValueError) as e:
+                warnings.warn(f'Ignoring unreadable cache file {path}: {e}')
+
+        if adjacency is None:
+            adjacency = load()
+            write_atomic(path, lambda tmp: sparse.save_npz(tmp, adjacency), stale='ADJACENCY-*.npz')
+
+        self._spatial['adjacency'] = adjacency
+        return adjacency
+
+    def check_links(self, status='total'):
+        '''Bordering and linked node pairs, see spatial.check_links
+        '''
+        from .spatial import check_links
+
+        return check_links(
+            self.get_border_adjacency(),
+            self.get_network().matrix(status, 'both'),
+            self.NODES,
+        )
@@ -6,27 +6,33 @@
 
 '''
 
-import math
 import numpy as np
 import pandas as pd
-import networkx as nx
-import plotly.express as px
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
-import matplotlib.colors as mcolors
-import plotly.graph_objects as go
-from shapely import MultiPolygon, affinity
-import random
 
-from matplotlib.lines import Line2D
+# plotly, matplotlib and networkx are imported in the methods using them, so
+# importing this module stays fast
 
 from .database import GlobalTransmissionDatabase
+from .figure_cache import FigureCache, cached_figure
+from .geometry import line_coordinates, pick_tolerance
+from .topology import to_geojson
 
 class DatabasePlots:
 
-    def __init__(self
+    def __init__(self,
+            database=None,
+            cache_size=32,
+            cache_dir=None,
     ):
-        self.df = GlobalTransmissionDatabase()
+        '''database: GlobalTransmissionDatabase to plot, defaults to the
+        process-wide shared instance
+        cache_size: figures kept in memory, 0 to rebuild on every call
+        cache_dir: directory to also persist plotly figures in as JSON
+        '''
+        self.df = database if database is not None else GlobalTransmissionDatabase.shared()
+
+        # figures by method, arguments, DATABASE version and code version
+        self.figures = FigureCache(cache_size, cache_dir)
 
         # setup defaults
         self.default_map_margins = {"r":5,"t":5,"l":5,"b":5}
@@ -44,6 +50,7 @@ class DatabasePlots:
         pass
 
 
+    @cached_figure
     def map_transmission_lines(
             self,
             bins = [0,1,5,10,25],
@@ -61,14 +68,23 @@ class DatabasePlots:
             line_min_width=0.5,
             line_step=1.0,
             show_zero=False,
+            region=None,
             **kwargs,
     ):
         '''Plot FEO-Global nodes and edges
+
+        region: snapshot region to zoom to, see regions.SNAPSHOT_REGIONS
         '''
+        import plotly.graph_objects as go
 
         # load reference data
-        nodes = self.df.CENTRE_POINTS.copy()
-        links = self.df.DATABASE.copy()
+        if region is None:
+            nodes = self.df.CENTRE_POINTS.copy()
+            links = self.df.DATABASE.copy()
+        else:
+            subset = self.df.get_region(region)
+            nodes = subset['points'].copy()
+            links = subset['links'].copy()
 
         # # filter out nodes that are not in lines data
         # nodes = nodes.loc[
@@ -86,11 +102,29 @@ class DatabasePlots:
         for i in ['existing','planned']:
             links[i] = ( (links[f'{i} capacity + (mw)'].abs() + links[f'{i} capacity - (mw)'].abs()) / 2 ) / 1000 # MW -> GW
 
-        # map lat,lon to links
-        links['start_lat'] = links['from'].map( nodes.set_index('node').geometry.y.to_dict() )
-        links['start_lon'] = links['from'].map( nodes.set_index('node').geometry.x.to_dict() )
-        links['end_lat'] = links['to'].map( nodes.set_index('node').geometry.y.to_dict() )
-        links['end_lon'] = links['to'].map( nodes.set_index('node').geometry.x.to_dict() )
+        # map lat,lon to links through registry ids
+        start = links['from'].cat.codes.to_numpy()
+        end = links['to'].cat.codes.to_numpy()
+        links['start_lat'] = self.df.NODES.take('lat', start)
+        links['start_lon'] = self.df.NODES.take('lon', start)
+        links['end_lat'] = self.df.NODES.take('lat', end)
+        links['end_lon'] = self.df.NODES.take('lon', end)
+
+        # great-circle geometry of each link, shared with all plots
+        link_geometry = self.df.LINK_GEOMETRY
+        n = len(self.df.NODES)
+        keys = link_geometry['from_id'].to_numpy(dtype=np.int64) * n + link_geometry['to_id'].to_numpy()
+        wanted = start.astype(np.int64) * n + end
+        loc = np.searchsorted(keys, wanted).clip(max=max(len(keys) - 1, 0))
+        # pairs missing from LINK_GEOMETRY get no geometry, not a neighbour's
+        known = (start >= 0) & (end >= 0) & (len(keys) > 0)
+        known[known] = keys[loc[known]] == wanted[known]
+        length = np.full(len(links), np.nan)
+        length[known] = link_geometry['length (km)'].to_numpy()[loc[known]]
+        geometry = np.full(len(links), None, dtype=object)
+        geometry[known] = link_geometry.geometry.to_numpy()[loc[known]]
+        links['length (km)'] = length
+        links['geometry'] = geometry
 
         # bin capacities
         links['Capacity_Bin'] = pd.cut(
@@ -120,17 +154,8 @@ class DatabasePlots:
             # index dataframe
             idx_links = links.loc[links.Capacity_Bin == i]
 
-            # zip coords
-            lons = []
-            lats = []
-            lons = np.empty(3 * len(idx_links))
-            lons[::3] = idx_links['start_lon']
-            lons[1::3] = idx_links['end_lon']
-            lons[2::3] = None
-            lats = np.empty(3 * len(idx_links))
-            lats[::3] = idx_links['start_lat']
-            lats[1::3] = idx_links['end_lat']
-            lats[2::3] = None
+            # densified arcs, separated by NaN
+            lons, lats = line_coordinates(idx_links['geometry'].dropna())
 
             # set names
             name = i + ' GW'
@@ -212,9 +237,42 @@ class DatabasePlots:
 
         #plotly_defaults(fig)
 
+        if region is not None:
+            self._zoom(fig, subset['bbox'])
+
         return fig, nodes, links
 
 
+    def _zoom(
+            self,
+            fig,
+            bbox,
+    ):
+        '''Limit the geo axes of a map to a (lon min, lat min, lon max, lat max) box
+        '''
+        fig.update_geos(
+            lonaxis_range=[bbox[0], bbox[2]],
+            lataxis_range=[bbox[1], bbox[3]],
+        )
+
+
+    def map_regional_snapshots(
+            self,
+            regions=None,
+            **kwargs,
+    ):
+        '''Transmission line maps of each snapshot region, see
+        map_transmission_lines; returns figures by region
+        '''
+        from .regions import SNAPSHOT_REGIONS
+
+        return {
+            region : self.map_transmission_lines(region=region, **kwargs)[0]
+            for region in (regions or SNAPSHOT_REGIONS)
+        }
+
+
+    @cached_figure
     def map_excluded_regions(
             self,
             showgrid=False,
@@ -223,6 +281,7 @@ class DatabasePlots:
     ):
         '''Show regions included/excluded in the model
         '''
+        import plotly.express as px
 
         # update exclude column
         df = self.df.INCLUDED_REGIONS.copy()
@@ -309,6 +368,10 @@ class DatabasePlots:
     ):
         '''Network topology
         '''
+        import matplotlib.pyplot as plt
+        import networkx as nx
+        from matplotlib.lines import Line2D
+
         df = self.df.get_interregional_capacity(by=by).reset_index().copy()
 
         # rename columns
@@ -474,6 +537,7 @@ class DatabasePlots:
         return plt, df
     
 
+    @cached_figure
     def spatial_representation(
             self,
             show_excluded_regions=False,
@@ -482,14 +546,37 @@ class DatabasePlots:
                 'National' : 'oldlace', 
                 'Subnational' : 'sandybrown'
             },
+            tolerance='auto',
+            topology=False,
+            region=None,
             **kwargs,
     ):
+        '''Map national and subnational nodes
+
+        tolerance: simplification level of the boundaries, 'auto' to pick it
+        from the figure width or None for full resolution
+        topology: draw boundaries decoded from the TopoJSON topology of the
+        level, whose quantized coordinates are shorter in the figure
+        region: snapshot region to zoom to, drawn from its clipped geometry,
+        see regions.SNAPSHOT_REGIONS
+        '''
+        import plotly.express as px
         
         # get iso codes of included regions
         included_regions_iso = self.df.INCLUDED_REGIONS[self.df.INCLUDED_REGIONS.Included == "True"]["alpha-3"].tolist()
 
-        # get geom data
-        geom_df = self.df.GEOMETRY.copy()
+        # get geom data, simplified to the figure width
+        if region is not None:
+            from .regions import region_bbox
+            bbox = region_bbox(self.df.NODES, region)
+            if tolerance == 'auto':
+                tolerance = pick_tolerance(self.default_map_width, extent=bbox[2] - bbox[0])
+            geom_df = self.df.get_region_geometry(region, tolerance).copy()
+            topology = False
+        elif tolerance == 'auto':
+            geom_df = self.df.get_geometry(width=self.default_map_width).copy()
+        else:
+            geom_df = self.df.get_geometry(tolerance).copy()
 
         # remove excluded regions
         if not show_excluded_regions:
@@ -499,10 +586,17 @@ class DatabasePlots:
         geom_df.loc[ geom_df.SUBREGION == 'XX', 'Spatial Scale' ] = 'National'
         geom_df.loc[ geom_df.SUBREGION != 'XX', 'Spatial Scale' ] = 'Subnational'
 
+        # boundaries, optionally through the quantized topology
+        if topology:
+            level = pick_tolerance(self.default_map_width) if tolerance == 'auto' else tolerance
+            geojson = to_geojson(self.df.get_topology(level), properties=False)
+        else:
+            geojson = geom_df.geometry
+
         # make fig
         fig = px.choropleth(
             geom_df,
-            geojson=geom_df.geometry,
+            geojson=geojson,
             locations=geom_df.index,
             color="Spatial Scale", 
             hover_name="REGION",
@@ -561,6 +655,9 @@ class DatabasePlots:
             margin=self.default_map_margins,
             legend_title_text=None,
         )
+
+        if region is not None:
+            self._zoom(fig, bbox)
         
         return fig
         
@@ -0,0 +1,255 @@
+'''
+
+    export.py
+
+    Batch export of database figures
+
+'''
+
+import argparse
+import atexit
+import hashlib
+import json
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .database import GlobalTransmissionDatabase
+from .utils import code_version
+
+
+# figures of outputs/figures by file name as (DatabasePlots method,
+# arguments, layout updates of plotly figures, formats), following
+# notebooks/make_plots.ipynb
+MAP_COLOURS = {
+    'node' : 'teal',
+    'landcolor' : 'oldlace',
+    'borders' : 'lightgray',
+    'oceancolor' : 'white',
+    'line_existing' : 'lightcoral',
+    'line_planned' : 'navy',
+}
+MAP_LAYOUT = {
+    'title' : {'font' : {'size' : 24}},
+    'title_x' : 0.1,
+    'title_y' : 0.9,
+    'legend' : {'yanchor' : 'top', 'y' : 1.1, 'xanchor' : 'center', 'x' : 0.5, 'orientation' : 'h'},
+}
+FIGURES = {
+    'map_excluded_regions' : {
+        'method' : 'map_excluded_regions',
+        'kwargs' : {'showgrid' : False, 'colours' : {'Included' : '#d3e6d4', 'Excluded' : '#f0a3af'}},
+        'layout' : {
+            'title_text' : '<b>a)</b>',
+            'title_font' : {'size' : 22},
+            'title_x' : 0.02,
+            'title_y' : 0.95,
+            'legend' : {'yanchor' : 'top', 'y' : 0.6, 'xanchor' : 'left', 'x' : 0.05, 'orientation' : 'v'},
+        },
+        'formats' : ['html', 'pdf', 'png'],
+    },
+    'map_capacity_existing' : {
+        'method' : 'map_transmission_lines',
+        'kwargs' : {
+            'planned_capacity' : False, 'node_size' : 4, 'colours' : MAP_COLOURS, 'line_min_width' : 1,
+            'showgrid' : False, 'title' : '<b>a)</b>', 'legend_title' : None,
+        },
+        'layout' : MAP_LAYOUT,
+        'formats' : ['html', 'pdf', 'png'],
+    },
+    'map_capacity_planned' : {
+        'method' : 'map_transmission_lines',
+        'kwargs' : {
+            'planned_capacity' : True, 'node_size' : 4, 'colours' : MAP_COLOURS, 'line_min_width' : 1,
+            'showgrid' : False, 'title' : '<b>b)</b>', 'legend_title' : None,
+        },
+        'layout' : MAP_LAYOUT,
+        'formats' : ['html', 'pdf', 'png'],
+    },
+    'spatial-representation' : {
+        'method' : 'spatial_representation',
+        'kwargs' : {},
+        'layout' : {'title_text' : '<b>b)</b>', 'title_font' : {'size' : 22}, 'title_x' : 0.02, 'title_y' : 0.95},
+        'formats' : ['png'],
+    },
+    'nx_network_topology' : {
+        'method' : 'network_topology',
+        'kwargs' : {'by' : 'subregion', 'node_size' : 1800, 'figsize' : (12, 6)},
+        'formats' : ['pdf'],
+    },
+}
+
+MANIFEST = '.export-manifest.json'
+
+
+# per process state of pool workers, set once by _init_worker
+_WORKER = {}
+
+
+def _start_renderer():
+    '''Start one long-lived kaleido renderer for this process, reused by
+    every write_image call; older kaleido versions start their own per call
+    '''
+    try:
+        import kaleido
+        kaleido.start_sync_server(silence_warnings=True)
+    except Exception:
+        # no kaleido, an older kaleido, or no browser to render with
+        return
+    atexit.register(_stop_renderer)
+
+
+def _stop_renderer():
+    try:
+        import kaleido
+        kaleido.stop_sync_server(silence_warnings=True)
+    except Exception:
+        pass
+
+
+def _init_worker(data_dir):
+    from .dataviz import DatabasePlots
+
+    _WORKER['plots'] = DatabasePlots(GlobalTransmissionDatabase.shared(data_dir))
+    _start_renderer()
+
+
+def _render(task):
+    '''Build one figure and write it in each requested format, returns the
+    written paths and the errors of paths that failed
+    '''
+    name, spec, paths = task
+    result = getattr(_WORKER['plots'], spec['method'])(**spec['kwargs'])
+
+    # plotly figures, or (plotly figure, ...) tuples, or pyplot from network_topology
+    fig = result[0] if isinstance(result, tuple) else result
+    plotly = hasattr(fig, 'update_layout')
+    if plotly:
+        fig.update_layout(**spec.get('layout', {}))
+
+    written, failed = [], {}
+    for path in paths:
+        try:
+            if not plotly:
+                fig.savefig(path, bbox_inches='tight')
+            elif path.endswith('.html'):
+                fig.write_html(path)
+            else:
+                fig.write_image(path)
+            written.append(path)
+        except Exception as e:
+            failed[path] = f'{type(e).__name__}: {str(e).strip()}'
+
+    if not plotly:
+        fig.close('all')
+    return written, failed
+
+
+def _output_hash(spec, fmt, version) -> str:
+    '''Hash of everything an output depends on: the figure spec, its format,
+    and the data and code versions
+    '''
+    key = json.dumps({'spec' : spec, 'format' : fmt, 'version' : version}, sort_keys=True, default=str)
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def export_figures(
+        figures=None,
+        formats=None,
+        out_dir='outputs/figures',
+        data_dir='data',
+        workers=None,
+        force=False,
+) -> list:
+    '''Render figures of FIGURES to out_dir, returns the written paths
+
+    Figures are rendered across a process pool; each worker loads the
+    database and starts a renderer once. Outputs whose hash (figure spec,
+    format, data and code versions) matches the manifest in out_dir and that
+    still exist are skipped unless force is set.
+
+    figures: names in FIGURES, defaults to all
+    formats: restrict to these formats, e.g. ['png']
+    '''
+    figures = figures or list(FIGURES)
+    unknown = set(figures) - set(FIGURES)
+    if unknown:
+        raise ValueError(f'Unknown figures {sorted(unknown)}, expected some of {list(FIGURES)}')
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.is_file() else {}
+
+    version = f'{GlobalTransmissionDatabase(data_dir).data_version}-{code_version()}'
+
+    # outputs to render, grouped by figure so each is built once
+    tasks, hashes = [], {}
+    for name in figures:
+        spec = FIGURES[name]
+        paths = []
+        for fmt in spec['formats']:
+            if formats and fmt not in formats:
+                continue
+            path = out_dir / f'{name}.{fmt}'
+            h = _output_hash(spec, fmt, version)
+            if not force and path.is_file() and manifest.get(path.name) == h:
+                continue
+            hashes[path.name] = h
+            paths.append(str(path))
+        if paths:
+            tasks.append((name, spec, paths))
+
+    if not tasks:
+        return []
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers == 1:
+        _init_worker(data_dir)
+        results = [_render(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(data_dir,),
+        ) as pool:
+            results = list(pool.map(_render, tasks))
+
+    # record what was written, so failed outputs are retried next time
+    written = [p for w, _ in results for p in w]
+    failed = {p : e for _, f in results for p, e in f.items()}
+    manifest.update({Path(p).name : hashes[Path(p).name] for p in written})
+    manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+    if failed:
+        raise RuntimeError('Failed to export:\n' + '\n'.join(f'{p}: {e}' for p, e in failed.items()))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export Global Transmission Database figures')
+    parser.add_argument('figures', nargs='*', help=f'figures to export, default all of: {", ".join(FIGURES)}')
+    parser.add_argument('--formats', nargs='+', help='only export these formats, e.g. png pdf')
+    parser.add_argument('--out-dir', default='outputs/figures', help='output directory (default: %(default)s)')
+    parser.add_argument('--data-dir', default='data', help='data directory (default: %(default)s)')
+    parser.add_argument('--workers', type=int, help='worker processes, default one per CPU')
+    parser.add_argument('--force', action='store_true', help='export even if unchanged')
+    args = parser.parse_args(argv)
+
+    written = export_figures(
+        figures=args.figures,
+        formats=args.formats,
+        out_dir=args.out_dir,
+        data_dir=args.data_dir,
+        workers=args.workers,
+        force=args.force,
+    )
+    for path in written:
+        print(path)
+    if not written:
+        print('All figures up to date')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+'''
+
+    figure_cache.py
+
+    Memoization of DatabasePlots figures
+
+'''
+
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import warnings
+
+from collections import OrderedDict
+from pathlib import Path
+
+from .utils import code_version, write_atomic
+
+
+def _copy(value):
+    '''Copy of a cached figure, or of each item of a tuple of results
+    '''
+    if isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    if hasattr(value, 'to_plotly_json'):
+        import plotly.graph_objects as go
+        return go.Figure(value)
+    if hasattr(value, 'copy'):
+        return value.copy()
+    return value
+
+
+class FigureCache:
+    '''Least recently used cache of figures keyed by method, normalized
+    arguments, DATABASE version and code version
+
+    Results are copied in and out so callers can edit returned figures.
+    With cache_dir set, plotly figures are also stored there as JSON and
+    survive the process; tuples of results (e.g. figure, nodes, links) are
+    kept in memory only.
+    '''
+
+    def __init__(
+            self,
+            maxsize=32,
+            cache_dir=None,
+    ):
+        self.maxsize = maxsize
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._figures)
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+
+    @staticmethod
+    def key(
+            method,
+            args : tuple,
+            kwargs : dict,
+            version : str,
+    ) -> str:
+        '''Hash of a call, the same for equivalent positional, keyword and
+        default arguments
+        '''
+        bound = inspect.signature(method).bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        arguments.update(arguments.pop('kwargs', {}))
+        arguments.pop('self', None)
+        payload = json.dumps(
+            {'method' : method.__qualname__, 'arguments' : arguments, 'version' : version},
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+    def _path(self, key):
+        return self.cache_dir / f'{key}.json'
+
+    def get(self, key):
+        '''Copy of a cached result, or None
+        '''
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return _copy(self._figures[key])
+
+        if self.cache_dir is not None and self._path(key).is_file():
+            import plotly.io as pio
+            try:
+                fig = pio.from_json(self._path(key).read_text())
+            except (OSError, ValueError) as e:
+                warnings.warn(f'Ignoring unreadable cache file {self._path(key)}: {e}')
+            else:
+                self._put(key, fig)
+                with self._lock:
+                    self.hits += 1
+                return _copy(fig)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _put(self, key, value):
+        with self._lock:
+            self._figures[key] = value
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.maxsize:
+                self._figures.popitem(last=False)
+
+    def put(self, key, value):
+        '''Cache a copy of a result, and write plotly figures to cache_dir
+        '''
+        self._put(key, _copy(value))
+
+        if self.cache_dir is not None and hasattr(value, 'to_json'):
+            write_atomic(self._path(key), lambda tmp: tmp.write_text(value.to_json()))
+
+
+def cached_figure(method):
+    '''Memoize a DatabasePlots method in its figure cache, keyed by its
+    arguments, the plot defaults, the DATABASE version (see
+    GlobalTransmissionDatabase.database_version) and the source code
+    '''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(self, 'figures', None)
+        if cache is None or cache.maxsize <= 0:
+            return method(self, *args, **kwargs)
+
+        defaults = {k : v for k, v in vars(self).items() if k.startswith('default_')}
+        version = f'{self.df.database_version}-{code_version()}-{json.dumps(defaults, sort_keys=True)}'
+        key = cache.key(method, (self,) + args, kwargs, version)
+        result = cache.get(key)
+        if result is None:
+            result = method(self, *args, **kwargs)
+            cache.put(key, result)
+        return result
+
+    return wrapper
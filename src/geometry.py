@@ -0,0 +1,314 @@
+'''
+
+    geometry.py
+
+    Great-circle lengths and geometry of transmission links
+
+'''
+
+import numpy as np
+import pandas as pd
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# simplification tolerances (degrees) of the geometry pyramid, finest first
+SIMPLIFY_TOLERANCES = [0.01, 0.05, 0.1, 0.25]
+
+
+def unit_vectors(lon, lat):
+    '''Points on the unit sphere, shape (n, 3)
+    '''
+    lon, lat = np.radians(lon), np.radians(lat)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def haversine(
+        lon1,
+        lat1,
+        lon2,
+        lat2,
+        radius=EARTH_RADIUS_KM,
+) -> np.ndarray:
+    '''Great-circle distance (km) between arrays of points
+    '''
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(a, dtype=float)) for a in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def great_circle_points(
+        lon1,
+        lat1,
+        lon2,
+        lat2,
+        spacing_km=100,
+) -> tuple:
+    '''Densified great-circle arcs between arrays of points
+
+    Each arc is split into segments of at most spacing_km, all arcs at once
+    by spherical linear interpolation. Returns lon, lat and the arc index of
+    every point, with arcs stored one after the other.
+    '''
+    a = unit_vectors(lon1, lat1)
+    b = unit_vectors(lon2, lat2)
+    omega = np.arccos(np.clip((a * b).sum(axis=1), -1, 1))
+
+    # number of segments per arc and the fraction along it of every point
+    segments = np.maximum(np.ceil(omega * EARTH_RADIUS_KM / spacing_km), 1).astype(int)
+    index = np.repeat(np.arange(len(segments)), segments + 1)
+    offsets = np.cumsum(segments + 1) - (segments + 1)
+    fraction = (np.arange(len(index)) - offsets[index]) / segments[index]
+
+    # slerp, falling back to a for coincident points
+    w = omega[index]
+    sin_w = np.sin(w)
+    safe = sin_w > 1e-12
+    wa = np.where(safe, np.sin((1 - fraction) * w) / np.where(safe, sin_w, 1), 1 - fraction)
+    wb = np.where(safe, np.sin(fraction * w) / np.where(safe, sin_w, 1), fraction)
+    p = wa[:, None] * a[index] + wb[:, None] * b[index]
+
+    lon = np.degrees(np.arctan2(p[:, 1], p[:, 0]))
+    lat = np.degrees(np.arctan2(p[:, 2], np.hypot(p[:, 0], p[:, 1])))
+    return lon, lat, index
+
+
+def link_geometry(
+        nodes,
+        database : pd.DataFrame,
+        spacing_km=100,
+):
+    '''Length and great-circle geometry of every (from, to) node pair in
+    database, as a GeoDataFrame
+
+    length (km) is between node centroids and pop_length (km) between
+    population centres; geometry is the centroid to centroid arc, densified
+    to spacing_km.
+    '''
+    import geopandas as gpd
+    import shapely
+
+    # unique linked node pairs
+    f = database['from'].cat.codes.to_numpy()
+    t = database['to'].cat.codes.to_numpy()
+    valid = (f >= 0) & (t >= 0)
+    pairs = np.unique(np.stack([f[valid], t[valid]], axis=1), axis=0)
+    f, t = pairs[:, 0], pairs[:, 1]
+
+    lon, lat, index = great_circle_points(nodes.lon[f], nodes.lat[f], nodes.lon[t], nodes.lat[t], spacing_km)
+
+    return gpd.GeoDataFrame({
+        'from' : nodes.node[f].astype(str),
+        'to' : nodes.node[t].astype(str),
+        'from_id' : f.astype(np.int32),
+        'to_id' : t.astype(np.int32),
+        'length (km)' : haversine(nodes.lon[f], nodes.lat[f], nodes.lon[t], nodes.lat[t]),
+        'pop_length (km)' : haversine(nodes.pop_lon[f], nodes.pop_lat[f], nodes.pop_lon[t], nodes.pop_lat[t]),
+    }, geometry=shapely.linestrings(np.stack([lon, lat], axis=1), indices=index), crs='EPSG:4326')
+
+
+def line_coordinates(
+        geometry,
+) -> tuple:
+    '''Flat lon and lat arrays of line geometries separated by NaN, as
+    plotly expects for many lines in one trace
+    '''
+    import shapely
+
+    coords, index = shapely.get_coordinates(np.asarray(geometry), return_index=True)
+    if not len(coords):
+        return np.array([]), np.array([])
+
+    # one NaN after the end of every line
+    breaks = np.flatnonzero(np.diff(index)) + 1
+    coords = np.insert(coords, np.append(breaks, len(coords)), np.nan, axis=0)
+    return coords[:, 0], coords[:, 1]
+
+
+def line_length(
+        geometry,
+) -> np.ndarray:
+    '''Great-circle length (km) of lon/lat line geometries, summed over the
+    parts of multi-part geometries
+    '''
+    import shapely
+
+    geometry = np.asarray(geometry)
+    parts, owner = shapely.get_parts(geometry, return_index=True)
+    coords, index = shapely.get_coordinates(parts, return_index=True)
+
+    # segments between consecutive coordinates of the same part
+    same = index[1:] == index[:-1]
+    segment = haversine(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    per_part = np.bincount(index[1:][same], weights=segment[same], minlength=len(parts))
+    return np.bincount(owner, weights=per_part, minlength=len(geometry))
+
+
+def split_antimeridian(
+        geometry,
+) -> np.ndarray:
+    '''Lon/lat line geometries with parts cut at the antimeridian, so planar
+    operations do not follow segments wrapping around the globe
+    '''
+    import shapely
+
+    geometry = np.asarray(geometry)
+    coords, index = shapely.get_coordinates(geometry, return_index=True)
+    lon, lat = coords[:, 0], coords[:, 1]
+
+    # segments of a line jumping more than 180 degrees cross the antimeridian
+    jump = np.flatnonzero((index[1:] == index[:-1]) & (np.abs(np.diff(lon)) > 180))
+    if not len(jump):
+        return geometry
+
+    # latitude where each crossing segment meets +/-180
+    side = np.sign(lon[jump])
+    unwrapped = lon[jump + 1] + 360 * side
+    share = (180 * side - lon[jump]) / (unwrapped - lon[jump])
+    lat_cross = lat[jump] + share * (lat[jump + 1] - lat[jump])
+
+    # end the part at the crossing and start the next from the other side
+    at = np.repeat(jump + 1, 2)
+    lon = np.insert(lon, at, np.stack([180 * side, -180 * side], axis=1).ravel())
+    lat = np.insert(lat, at, np.repeat(lat_cross, 2))
+    owner = np.insert(index, at, np.repeat(index[jump], 2))
+    new_part = np.concatenate([[True], owner[1:] != owner[:-1]])
+    new_part[(at + np.arange(len(at)))[1::2]] = True
+    part = np.cumsum(new_part) - 1
+
+    lines = shapely.linestrings(np.stack([lon, lat], axis=1), indices=part)
+    part_owner = owner[new_part]
+    return shapely.multilinestrings(lines, indices=part_owner)
+
+
+def grid_precision(tolerance) -> int:
+    '''Decimals of the coordinate grid of a level, at most a fifth of its
+    tolerance
+    '''
+    return int(np.ceil(-np.log10(tolerance / 5)))
+
+
+def _valid_polygons(shapes):
+    '''Repair invalid shapes, keeping only their polygonal parts; shapes
+    that collapse to lines or points become empty
+    '''
+    import shapely
+
+    shapes = shapely.make_valid(shapes)
+    for i in np.flatnonzero(shapely.get_type_id(shapes) == 7):
+        parts = shapely.get_parts(shapes[i])
+        parts = parts[np.isin(shapely.get_type_id(parts), [3, 6])]
+        shapes[i] = shapely.union_all(parts) if len(parts) else shapely.Polygon()
+    shapes[~np.isin(shapely.get_type_id(shapes), [3, 6])] = shapely.Polygon()
+    return shapes
+
+
+def _snap(shapes, digits, fallback):
+    '''Shapes snapped to a grid of digits decimals, or their fallback shape
+    where snapping fails
+    '''
+    import shapely
+
+    grid = 10.0 ** -digits
+    try:
+        shapes = shapely.set_precision(shapes, grid)
+    except shapely.errors.GEOSException:
+        snapped = shapes.copy()
+        for i, shape in enumerate(shapes):
+            try:
+                snapped[i] = shapely.set_precision(shape, grid)
+            except shapely.errors.GEOSException:
+                snapped[i] = None
+        shapes = snapped
+
+    failed = shapely.is_missing(shapes)
+    # round so coordinates serialise with few digits
+    shapes[~failed] = shapely.transform(shapes[~failed], lambda c: np.round(c, digits))
+    shapes[failed] = fallback[failed]
+    return shapes
+
+
+def _polygons(arcs, objects):
+    '''Shapes of TopoJSON geometry objects from decoded arc coordinates,
+    dropping rings that collapsed to fewer than three points and polygons
+    whose exterior collapsed
+    '''
+    import shapely
+
+    def ring(ids):
+        coords = np.concatenate([arcs[i] if i >= 0 else arcs[~i][::-1] for i in ids])
+        coords = coords[np.concatenate([[True], (coords[1:] != coords[:-1]).any(axis=1)])]
+        return coords if len(coords) >= 4 else None
+
+    shapes = []
+    for obj in objects:
+        parts = []
+        polygons = [obj['arcs']] if obj['type'] == 'Polygon' else obj.get('arcs', [])
+        for rings in polygons:
+            rings = [ring(r) for r in rings]
+            if rings[0] is not None:
+                parts.append(shapely.Polygon(rings[0], [r for r in rings[1:] if r is not None]))
+        shapes.append(shapely.MultiPolygon(parts) if len(parts) > 1 else parts[0] if parts else shapely.Polygon())
+    return np.array(shapes, dtype=object)
+
+
+def simplify_geometry(
+        geometry,
+        tolerances=SIMPLIFY_TOLERANCES,
+):
+    '''Pyramid of simplified copies of a polygon GeoDataFrame, stacked with
+    a tolerance column
+
+    Borders are cut into the arcs of a topology (see topology.to_topojson)
+    on the grid of the finest level, and each arc is simplified once per
+    level with its end points kept, so neighbouring shapes keep identical
+    borders. Shapes are rebuilt from the simplified arcs, repaired where
+    arcs cross, and snapped to a grid of grid_precision decimals. Shapes
+    that collapse or fail to snap at a level keep their shape from the
+    finer level.
+    '''
+    import shapely
+    from .topology import to_topojson
+
+    topology = to_topojson(geometry.geometry, step=10.0 ** -grid_precision(min(tolerances)))
+    objects = topology['objects']['nodes']['geometries']
+    scale = np.asarray(topology['transform']['scale'])
+    translate = np.asarray(topology['transform']['translate'])
+    arcs = [np.cumsum(np.asarray(a, dtype=float).reshape(-1, 2), axis=0) for a in topology['arcs']]
+    lines = shapely.linestrings(
+        np.concatenate(arcs) * scale + translate,
+        indices=np.repeat(np.arange(len(arcs)), [len(a) for a in arcs]),
+    )
+
+    levels = []
+    previous = geometry.geometry.to_numpy()
+    for tolerance in sorted(tolerances):
+        digits = grid_precision(tolerance)
+        coords, arc = shapely.get_coordinates(
+            shapely.simplify(lines, tolerance, preserve_topology=True), return_index=True,
+        )
+        arcs = np.split(np.round(coords, digits), np.flatnonzero(np.diff(arc)) + 1)
+
+        shapes = _snap(_valid_polygons(_polygons(arcs, objects)), digits, previous)
+        shapes = np.where(shapely.is_empty(shapes), previous, shapes)
+        previous = shapes
+
+        level = geometry.copy()
+        level['tolerance'] = tolerance
+        level.geometry = shapes
+        levels.append(level)
+
+    return pd.concat(levels)
+
+
+def pick_tolerance(
+        width,
+        extent=360,
+        tolerances=SIMPLIFY_TOLERANCES,
+):
+    '''Coarsest tolerance within one pixel of a figure width (px) spanning
+    extent degrees of longitude, or the finest level for very wide figures
+    '''
+    per_pixel = extent / width
+    fitting = [t for t in tolerances if t <= per_pixel]
+    return max(fitting) if fitting else min(tolerances)
@@ -0,0 +1,273 @@
+'''
+
+    network.py
+
+    Sparse matrix view of the transmission network
+
+'''
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+
+from .nodes import NodeRegistry
+
+
+STATUSES = ['existing', 'planned', 'total']
+DIRECTIONS = ['+', '-', 'both']
+MODES = ['out', 'in', 'all']
+
+
+def zone_codes(
+        nodes : NodeRegistry,
+        mapping,
+) -> tuple:
+    '''Zone code of every node (-1 for none) and the zone labels
+
+    mapping: a NodeRegistry attribute name (e.g. 'country'), a dict or Series
+    of node name to zone, or an array of zones aligned with registry ids.
+    '''
+    if isinstance(mapping, str):
+        zones = nodes.take(mapping, np.arange(len(nodes)))
+    elif isinstance(mapping, (dict, pd.Series)):
+        zones = pd.Series(nodes.node).map(mapping).to_numpy()
+    else:
+        zones = np.asarray(mapping)
+        if len(zones) != len(nodes):
+            raise ValueError(f'Expected {len(nodes)} zones, one per node, got {len(zones)}')
+
+    codes, labels = pd.factorize(zones, sort=True)
+    return codes, pd.Index(labels, name='zone')
+
+
+def zoning_key(
+        codes : np.ndarray,
+        labels : pd.Index,
+) -> str:
+    '''Hash of a zoning by its zone codes and labels, see zone_codes, so equal
+    mappings share cached results and edited ones do not
+    '''
+    return hashlib.sha1(codes.tobytes() + '\0'.join(map(str, labels)).encode()).hexdigest()
+
+
+def zone_projection(
+        nodes : NodeRegistry,
+        mapping,
+) -> tuple:
+    '''Sparse node to zone projection matrix P, with P[i, z] = 1 if node i is
+    in zone z, and the zone labels of its columns, see zone_codes. Nodes
+    without a zone get an empty row and drop out of aggregations.
+    '''
+    codes, labels = zone_codes(nodes, mapping)
+    rows = np.flatnonzero(codes >= 0)
+    P = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, codes[rows])),
+        shape=(len(nodes), len(labels)),
+    )
+    return P, labels
+
+
+def to_frame(
+        matrix : sparse.spmatrix,
+        zones : pd.Index,
+        name='capacity',
+) -> pd.DataFrame:
+    '''Non-zero entries of a zone (or node) matrix as a (from, to) indexed frame
+    '''
+    m = matrix.tocoo()
+    index = pd.MultiIndex.from_arrays([zones[m.row], zones[m.col]], names=['from','to'])
+    return pd.DataFrame({name : m.data}, index=index).sort_index()
+
+
+class TransmissionNetwork:
+    '''Directed capacity matrices (MW) of the network indexed by registry id
+
+    All matrices are oriented sending node (row) to receiving node (column):
+
+    - direction '+' holds the + capacity of each link at [from, to]
+    - direction '-' holds the - capacity of each link at [to, from]
+    - direction 'both' is their sum, the capacity available from row to column
+
+    Status 'total' is existing plus planned capacity. Links with zero capacity
+    are not stored.
+    '''
+
+    def __init__(
+            self,
+            nodes : NodeRegistry,
+            cube : pd.DataFrame,
+    ):
+        '''cube: capacity columns of DATABASE summed by (from, to) registry id
+        '''
+        self.nodes = nodes
+        self._from = cube.index.get_level_values('from').to_numpy()
+        self._to = cube.index.get_level_values('to').to_numpy()
+        self._capacity = {
+            (status, direction) : cube[f'{status} capacity {direction} (mw)'].abs().to_numpy(dtype=float)
+            for status in ['existing', 'planned']
+            for direction in ['+', '-']
+        }
+        self._matrices = {}
+
+    @classmethod
+    def from_database(cls, db):
+        return cls(db.NODES, db._node_capacity_cube())
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def matrix(
+            self,
+            status='existing',
+            direction='both',
+            format='csr',
+    ) -> sparse.spmatrix:
+        '''Capacity matrix in csr or csc format, cached per arguments
+        '''
+        if status not in STATUSES:
+            raise ValueError(f'Unknown status {status!r}, expected one of {STATUSES}')
+        if direction not in DIRECTIONS:
+            raise ValueError(f'Unknown direction {direction!r}, expected one of {DIRECTIONS}')
+        if format not in ['csr', 'csc']:
+            raise ValueError(f"Unknown format {format!r}, expected 'csr' or 'csc'")
+
+        key = (status, direction, format)
+        if key not in self._matrices:
+            statuses = ['existing', 'planned'] if status == 'total' else [status]
+            directions = ['+', '-'] if direction == 'both' else [direction]
+
+            rows, cols, data = [], [], []
+            for s in statuses:
+                for d in directions:
+                    rows.append(self._from if d == '+' else self._to)
+                    cols.append(self._to if d == '+' else self._from)
+                    data.append(self._capacity[(s, d)])
+
+            n = len(self.nodes)
+            m = sparse.coo_matrix(
+                (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                shape=(n, n),
+            ).asformat(format)
+            m.sum_duplicates()
+            m.eliminate_zeros()
+            self._matrices[key] = m
+
+        return self._matrices[key]
+
+    def node_id(self, node) -> int:
+        '''Registry id of a node name or id
+        '''
+        if isinstance(node, (int, np.integer)):
+            if not 0 <= node < len(self.nodes):
+                raise KeyError(f'Node id {node} out of range')
+            return int(node)
+        return int(self.nodes.ids([node])[0])
+
+    def neighbours(
+            self,
+            node,
+            status='existing',
+            mode='all',
+    ) -> np.ndarray:
+        '''Ids of nodes a node can send to (out), receive from (in) or either
+        '''
+        if mode not in MODES:
+            raise ValueError(f'Unknown mode {mode!r}, expected one of {MODES}')
+        i = self.node_id(node)
+        out = self.matrix(status, format='csr')[i].indices
+        into = self.matrix(status, format='csc')[:, i].indices
+        if mode == 'out':
+            return np.sort(out)
+        if mode == 'in':
+            return np.sort(into)
+        return np.union1d(out, into)
+
+    def degree(
+            self,
+            status='existing',
+            mode='all',
+    ) -> np.ndarray:
+        '''Number of neighbours of every node, indexed by registry id
+        '''
+        if mode not in MODES:
+            raise ValueError(f'Unknown mode {mode!r}, expected one of {MODES}')
+        m = self.matrix(status)
+        if mode == 'all':
+            m = m + m.T
+        elif mode == 'in':
+            m = m.T.tocsr()
+        return np.diff(m.indptr)
+
+    def capacity(
+            self,
+            status='existing',
+            mode='out',
+    ) -> np.ndarray:
+        '''Total capacity out of (row sums) or into (column sums) every node
+        '''
+        if mode not in ['out', 'in']:
+            raise ValueError(f"Unknown mode {mode!r}, expected 'out' or 'in'")
+        axis = 1 if mode == 'out' else 0
+        return np.asarray(self.matrix(status).sum(axis=axis)).ravel()
+
+    def aggregate(
+            self,
+            mapping,
+            status='existing',
+            direction='both',
+    ) -> tuple:
+        '''Zone to zone capacity Pᵀ·C·P for a node to zone mapping, see
+        zone_codes, returned with the zone labels. Capacity within a zone
+        is dropped.
+        '''
+        return self.aggregate_batch([mapping], status=status, direction=direction)[0]
+
+    def aggregate_batch(
+            self,
+            mappings : list,
+            status='existing',
+            direction='both',
+    ) -> list:
+        '''aggregate() for many zonings at once
+
+        The projections are stacked into one block diagonal matrix B and the
+        capacity matrix repeated along the diagonal of I⊗C, so all zonings
+        cost two sparse products, Bᵀ·(I⊗C)·B, instead of one per zoning.
+        '''
+        zonings = [zone_codes(self.nodes, m) for m in mappings]
+        if not zonings:
+            return []
+
+        n = len(self.nodes)
+        sizes = np.array([len(labels) for _, labels in zonings])
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+        # block diagonal projection, zoning k maps rows k*n.. to columns offsets[k]..
+        codes = np.stack([c for c, _ in zonings])
+        k, i = np.nonzero(codes >= 0)
+        B = sparse.csr_matrix(
+            (np.ones(len(k)), (k * n + i, offsets[k] + codes[k, i])),
+            shape=(n * len(zonings), offsets[-1]),
+        )
+        C = sparse.kron(sparse.identity(len(zonings), format='csr'), self.matrix(status, direction), format='csr')
+        R = (B.T @ C @ B).tocoo()
+
+        # split the diagonal blocks, dropping capacity within a zone
+        keep = R.row != R.col
+        rows, cols, data = R.row[keep], R.col[keep], R.data[keep]
+        order = np.argsort(rows, kind='stable')
+        rows, cols, data = rows[order], cols[order], data[order]
+        bounds = np.searchsorted(rows, offsets)
+
+        results = []
+        for z, (_, labels) in enumerate(zonings):
+            s, e = bounds[z], bounds[z + 1]
+            block = sparse.csr_matrix(
+                (data[s:e], (rows[s:e] - offsets[z], cols[s:e] - offsets[z])),
+                shape=(sizes[z], sizes[z]),
+            )
+            results.append((block, labels))
+        return results
@@ -0,0 +1,95 @@
+'''
+
+    nodes.py
+
+    Integer registry of transmission nodes
+
+'''
+
+import numpy as np
+import pandas as pd
+
+
+class NodeRegistry:
+    '''Assigns each node a dense integer id and holds node attributes as
+    arrays aligned with those ids, so joins become array takes.
+
+    Ids are positions in nodes.csv. Tables store nodes as categoricals over
+    NodeRegistry.nodes, so their categorical codes are registry ids, with -1
+    for nodes that are not in the registry.
+    '''
+
+    # attributes available for lookups and aggregation
+    ATTRIBUTES = ['node', 'iso', 'country', 'region', 'subregion', 'lon', 'lat', 'pop_lon', 'pop_lat']
+
+    def __init__(
+            self,
+            nodes : pd.DataFrame,
+    ):
+        '''nodes: node table with lower case nodes.csv columns plus region and
+        subregion
+        '''
+        self.nodes = pd.Index(nodes['node'], name='node')
+
+        if not self.nodes.is_unique:
+            raise ValueError(f'Duplicate nodes: {self.nodes[self.nodes.duplicated()].tolist()}')
+
+        self.node = self.nodes.to_numpy(dtype=object)
+        self.iso = nodes['iso'].to_numpy(dtype=object)
+        self.country = nodes['country'].to_numpy(dtype=object)
+        self.region = nodes['region'].to_numpy(dtype=object)
+        self.subregion = nodes['subregion'].to_numpy(dtype=object)
+        self.lon = nodes['centroid_lon'].to_numpy(dtype=float)
+        self.lat = nodes['centroid_lat'].to_numpy(dtype=float)
+        self.pop_lon = nodes['pop_lon'].to_numpy(dtype=float)
+        self.pop_lat = nodes['pop_lat'].to_numpy(dtype=float)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def ids(
+            self,
+            nodes,
+            strict=True,
+    ) -> np.ndarray:
+        '''Registry ids of node names, unknown nodes raise a KeyError unless
+        strict is False, in which case they get -1
+        '''
+        ids = self.nodes.get_indexer(pd.Index(nodes)).astype(np.int32)
+        if strict and (ids < 0).any():
+            unknown = pd.Index(nodes)[ids < 0].unique().tolist()
+            raise KeyError(f'Unknown nodes: {unknown}')
+        return ids
+
+    def categorical(
+            self,
+            nodes,
+    ) -> pd.Categorical:
+        '''Node names as a categorical whose codes are registry ids
+        '''
+        # unnamed categories, as parquet does not keep their name
+        return pd.Categorical(nodes, categories=self.nodes.rename(None))
+
+    def take(
+            self,
+            attribute : str,
+            ids,
+    ) -> np.ndarray:
+        '''Look up an attribute by registry id, ids of -1 give NaN
+        '''
+        if attribute not in self.ATTRIBUTES:
+            raise ValueError(f'Unknown node attribute {attribute!r}, expected one of {self.ATTRIBUTES}')
+
+        values = getattr(self, attribute)
+        ids = np.asarray(ids)
+        out = values.take(np.where(ids < 0, 0, ids))
+        missing = ids < 0
+        if missing.any():
+            out = out.astype(float if values.dtype.kind == 'f' else object)
+            out[missing] = np.nan
+        return out
+
+    def to_frame(self) -> pd.DataFrame:
+        '''All attributes as a DataFrame indexed by registry id
+        '''
+        return pd.DataFrame({a : getattr(self, a) for a in self.ATTRIBUTES})
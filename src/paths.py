@@ -0,0 +1,89 @@
+'''
+
+    paths.py
+
+    All-pairs widest (bottleneck capacity) paths of the network
+
+'''
+
+import numpy as np
+import pandas as pd
+
+from .network import TransmissionNetwork
+
+
+class WidestPaths:
+    '''For every ordered node pair, the path maximising the smallest link
+    capacity along it, and that capacity (MW)
+
+    Built once with a vectorized max-min Floyd–Warshall over the directional
+    capacities of TransmissionNetwork.matrix(status). Widths are stored as a
+    float32 matrix and paths as an int16 next-hop matrix, so any path is
+    reconstructed by following next hops rather than searching the graph.
+    A node's width to itself is inf.
+    '''
+
+    def __init__(
+            self,
+            network : TransmissionNetwork,
+            status='existing',
+    ):
+        self.network = network
+        self.status = status
+
+        n = len(network)
+        if n > np.iinfo(np.int16).max:
+            raise ValueError(f'Too many nodes ({n}) for int16 next hops')
+
+        width = network.matrix(status, 'both').toarray().astype(np.float32)
+        np.fill_diagonal(width, np.inf)
+
+        # next hop from i towards j, -1 where j is unreachable
+        next_hop = np.where(width > 0, np.arange(n, dtype=np.int16)[None, :], -1).astype(np.int16)
+
+        for k in range(n):
+            through_k = np.minimum(width[:, k, None], width[None, k, :])
+            better = through_k > width
+            width = np.where(better, through_k, width)
+            next_hop = np.where(better, next_hop[:, k, None], next_hop)
+
+        self.width = width
+        self.next_hop = next_hop
+
+    def _id(self, node) -> int:
+        return self.network.node_id(node)
+
+    def capacity(
+            self,
+            source,
+            sink,
+    ) -> float:
+        '''Bottleneck capacity (MW) of the widest path, 0 if unreachable
+        '''
+        return float(self.width[self._id(source), self._id(sink)])
+
+    def path(
+            self,
+            source,
+            sink,
+    ) -> list:
+        '''Node names along the widest path, empty if unreachable
+        '''
+        i, j = self._id(source), self._id(sink)
+        if self.next_hop[i, j] < 0:
+            return []
+        path = [i]
+        while i != j:
+            i = int(self.next_hop[i, j])
+            path.append(i)
+        return self.network.nodes.node[path].tolist()
+
+    def to_frame(self) -> pd.DataFrame:
+        '''Widest path capacity of every pair as a node by node frame
+        '''
+        nodes = self.network.nodes.nodes
+        return pd.DataFrame(
+            self.width,
+            index=nodes.rename('from'),
+            columns=nodes.rename('to'),
+        )
@@ -0,0 +1,126 @@
+'''
+
+    regions.py
+
+    Regional subsets of the database for snapshot maps
+
+'''
+
+import numpy as np
+
+
+# central american and caribbean countries, split from the UN 'Latin America
+# and the Caribbean' subregion
+CENTRAL_AMERICA = [
+    'BLZ', 'CRI', 'SLV', 'GTM', 'HND', 'NIC', 'PAN',
+    'AIA', 'ATG', 'ABW', 'BHS', 'BRB', 'BES', 'CYM', 'CUB', 'CUW', 'DMA', 'DOM',
+    'GRD', 'GLP', 'HTI', 'JAM', 'MTQ', 'MSR', 'PRI', 'BLM', 'KNA', 'LCA', 'MAF',
+    'VCT', 'SXM', 'TTO', 'TCA', 'VGB', 'VIR',
+]
+
+# snapshot regions of the README, as node regions, subregions and iso codes
+# to include or exclude, and optionally a fixed (lon min, lat min, lon max,
+# lat max) box where the nodes span too far, e.g. Russia in Europe
+SNAPSHOT_REGIONS = {
+    'North America' : {'subregion' : ['Northern America'], 'iso' : ['MEX']},
+    'Central America' : {'iso' : CENTRAL_AMERICA},
+    'Latin America' : {'subregion' : ['Latin America and the Caribbean'], 'exclude' : CENTRAL_AMERICA + ['MEX']},
+    'Europe' : {'region' : ['Europe'], 'bbox' : (-25, 33, 50, 72)},
+    'MENA' : {'subregion' : ['Northern Africa', 'Western Asia'], 'iso' : ['IRN']},
+    'Sub-Saharan Africa' : {'subregion' : ['Sub-Saharan Africa']},
+    'Central Asia' : {'subregion' : ['Central Asia', 'Southern Asia'], 'exclude' : ['IRN']},
+    'Eastern Asia' : {'subregion' : ['Eastern Asia']},
+    'Southeast Asia' : {'subregion' : ['South-eastern Asia']},
+    'Oceania' : {'region' : ['Oceania']},
+}
+
+# degrees added around the centroids of a region's nodes
+BBOX_PADDING = 8
+
+
+def region_mask(
+        nodes,
+        name : str,
+) -> np.ndarray:
+    '''Boolean mask over registry ids of the nodes in a snapshot region
+    '''
+    if name not in SNAPSHOT_REGIONS:
+        raise ValueError(f'Unknown region {name!r}, expected one of {list(SNAPSHOT_REGIONS)}')
+    spec = SNAPSHOT_REGIONS[name]
+
+    mask = np.zeros(len(nodes), dtype=bool)
+    for attribute in ['region', 'subregion', 'iso']:
+        if attribute in spec:
+            mask |= np.isin(getattr(nodes, attribute), spec[attribute])
+    if 'exclude' in spec:
+        mask &= ~np.isin(nodes.iso, spec['exclude'])
+    return mask
+
+
+def region_bbox(
+        nodes,
+        name : str,
+        padding=BBOX_PADDING,
+) -> tuple:
+    '''(lon min, lat min, lon max, lat max) of a snapshot region, around the
+    centroids of its nodes unless fixed
+    '''
+    if 'bbox' in SNAPSHOT_REGIONS[name]:
+        return SNAPSHOT_REGIONS[name]['bbox']
+    mask = region_mask(nodes, name)
+    lon, lat = nodes.lon[mask], nodes.lat[mask]
+    return (
+        max(np.nanmin(lon) - padding, -180), max(np.nanmin(lat) - padding, -90),
+        min(np.nanmax(lon) + padding, 180), min(np.nanmax(lat) + padding, 90),
+    )
+
+
+def regional_subset(
+        db,
+        name : str,
+) -> dict:
+    '''Nodes, bounding box, centre points and links of a snapshot region,
+    without touching GEOMETRY, see regional_geometry
+
+    points: CENTRE_POINTS of the region nodes in the box
+    links: DATABASE rows with either end in the region
+    '''
+    nodes = db.NODES
+    mask = region_mask(nodes, name)
+    if not mask.any():
+        raise ValueError(f'No nodes in region {name!r}')
+    bbox = region_bbox(nodes, name)
+
+    links = db.DATABASE
+    in_region = np.zeros(len(links), dtype=bool)
+    for c in ['from','to']:
+        codes = links[c].cat.codes.to_numpy()
+        in_region |= (codes >= 0) & mask[codes.clip(min=0)]
+
+    return {
+        'name' : name,
+        'nodes' : mask,
+        'bbox' : bbox,
+        'points' : db.CENTRE_POINTS[mask & (nodes.lon >= bbox[0]) & (nodes.lon <= bbox[2])
+                                    & (nodes.lat >= bbox[1]) & (nodes.lat <= bbox[3])],
+        'links' : links[in_region],
+    }
+
+
+def regional_geometry(
+        db,
+        name : str,
+        tolerance=None,
+):
+    '''Region nodes of GEOMETRY (see get_geometry) clipped to the region box
+    '''
+    import shapely
+
+    mask = region_mask(db.NODES, name)
+    bbox = region_bbox(db.NODES, name)
+
+    geometry = db.get_geometry(tolerance)
+    ids = geometry['node_id'].to_numpy()
+    geometry = geometry[(ids >= 0) & mask[ids.clip(min=0)]].copy()
+    geometry.geometry = shapely.clip_by_rect(geometry.geometry.to_numpy(), *bbox)
+    return geometry[~geometry.geometry.is_empty]
@@ -0,0 +1,170 @@
+'''
+
+    scenarios.py
+
+    Batched what-if evaluation of capacity additions
+
+'''
+
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+
+from .network import zone_codes
+
+
+def zone_pairs(
+        codes : np.ndarray,
+        from_ids : np.ndarray,
+        to_ids : np.ndarray,
+) -> np.ndarray:
+    '''Sorted (from zone, to zone) code pairs, shape (P, 2), joined by the
+    links from_ids -> to_ids between different zones
+
+    codes: zone code of every node, -1 for none, see network.zone_codes
+    '''
+    zf, zt = codes[from_ids], codes[to_ids]
+    valid = (zf >= 0) & (zt >= 0) & (zf != zt)
+    return np.unique(np.stack([zf[valid], zt[valid]], axis=1), axis=0).reshape(-1, 2)
+
+
+def link_incidence(
+        codes : np.ndarray,
+        pairs : np.ndarray,
+        from_ids : np.ndarray,
+        to_ids : np.ndarray,
+) -> sparse.csr_matrix:
+    '''Links (rows) to zone pairs (columns), links within a zone or between
+    zones not in pairs have empty rows
+
+    codes: zone code of every node, -1 for none, see network.zone_codes
+    pairs: sorted (from zone, to zone) code pairs, see zone_pairs
+    '''
+    zf, zt = codes[from_ids], codes[to_ids]
+    n = int(max(codes.max(initial=-1), pairs.max(initial=-1))) + 1
+    keys = pairs[:, 0].astype(np.int64) * n + pairs[:, 1]
+    wanted = zf.astype(np.int64) * n + zt
+    loc = np.searchsorted(keys, wanted).clip(max=max(len(keys) - 1, 0))
+    hit = (zf >= 0) & (zt >= 0) & (len(keys) > 0)
+    hit[hit] = keys[loc[hit]] == wanted[hit]
+    rows = np.flatnonzero(hit)
+    return sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, loc[rows])),
+        shape=(len(zf), len(pairs)),
+    )
+
+
+class ScenarioEngine:
+    '''Interregional capacity of many capacity addition scenarios at once
+
+    Capacities are aggregated between zones like
+    GlobalTransmissionDatabase.get_interregional_capacity: + and - capacities
+    of the links between two zones are summed separately and the larger of
+    the two is reported. A sparse incidence matrix Q maps links to zone pairs,
+    so a batch of scenarios is a single product deltas · Q.
+    '''
+
+    def __init__(
+            self,
+            db,
+            by='subregion',
+            candidates=None,
+    ):
+        '''by: zoning of the nodes, see network.zone_codes
+        candidates: extra (from, to) node pairs, e.g. new corridors, whose
+        zone pairs are evaluated even if no link joins them yet
+        '''
+        self.nodes = db.NODES
+        self.codes, self.zones = zone_codes(self.nodes, by)
+
+        # links are the (from, to) node pairs of DATABASE
+        cube = db._node_capacity_cube()
+        self._from = cube.index.get_level_values('from').to_numpy()
+        self._to = cube.index.get_level_values('to').to_numpy()
+        self.links = pd.MultiIndex.from_arrays(
+            [self.nodes.node[self._from], self.nodes.node[self._to]], names=['from','to'],
+        )
+        self._base = {
+            (status, direction) : cube[f'{status} capacity {direction} (mw)'].abs().to_numpy(dtype=float)
+            for status in ['existing', 'planned']
+            for direction in ['+', '-']
+        }
+
+        # zone pairs between different zones, in sorted order
+        from_ids, to_ids = self._from, self._to
+        if candidates is not None:
+            candidates = pd.MultiIndex.from_tuples(candidates)
+            from_ids = np.concatenate([from_ids, self.nodes.ids(candidates.get_level_values(0))])
+            to_ids = np.concatenate([to_ids, self.nodes.ids(candidates.get_level_values(1))])
+        pairs = zone_pairs(self.codes, from_ids, to_ids)
+        self._pair_codes = pairs
+        self.pairs = pd.MultiIndex.from_arrays(
+            [self.zones[pairs[:, 0]], self.zones[pairs[:, 1]]], names=['from','to'],
+        )
+        self.Q = self._incidence(self._from, self._to)
+
+    def _incidence(
+            self,
+            from_ids : np.ndarray,
+            to_ids : np.ndarray,
+    ) -> sparse.csr_matrix:
+        '''Links (rows) to self.pairs (columns), see link_incidence
+        '''
+        return link_incidence(self.codes, self._pair_codes, from_ids, to_ids)
+
+    def _deltas(self, deltas):
+        '''Deltas as an (S, L) array or sparse matrix and their incidence
+        '''
+        if isinstance(deltas, pd.DataFrame):
+            links = pd.MultiIndex.from_tuples(deltas.columns)
+            if links.equals(self.links):
+                return deltas.to_numpy(dtype=float), self.Q
+            from_ids = self.nodes.ids(links.get_level_values(0))
+            to_ids = self.nodes.ids(links.get_level_values(1))
+            return deltas.to_numpy(dtype=float), self._incidence(from_ids, to_ids)
+
+        if not sparse.issparse(deltas):
+            deltas = np.atleast_2d(np.asarray(deltas, dtype=float))
+        if deltas.shape[1] != len(self.links):
+            raise ValueError(f'Expected deltas for {len(self.links)} links, got {deltas.shape[1]}')
+        return deltas, self.Q
+
+    def evaluate(
+            self,
+            deltas,
+            status='planned',
+            deltas_minus=None,
+    ) -> np.ndarray:
+        '''Aggregated capacity (MW) of every scenario and zone pair, shape
+        (scenarios, len(self.pairs))
+
+        deltas: capacity added to each link, an (S, L) array or sparse matrix
+        aligned with self.links, or a DataFrame whose columns are (from, to)
+        node tuples. Additions between zone pairs with no existing link are
+        ignored unless passed as candidates.
+        deltas_minus: additions in the - direction, defaults to deltas
+        status: 'existing', 'planned' or 'total' (existing plus planned)
+        '''
+        if status not in ['existing', 'planned', 'total']:
+            raise ValueError(f'Unknown status {status!r}')
+        statuses = ['existing', 'planned'] if status == 'total' else [status]
+
+        result = None
+        for direction, d in [('+', deltas), ('-', deltas if deltas_minus is None else deltas_minus)]:
+            base = sum(self._base[(s, direction)] for s in statuses) @ self.Q
+            d, Q = self._deltas(d)
+            # (Qᵀ · dᵀ)ᵀ keeps the sparse matrix on the left
+            added = Q.T @ d.T
+            added = added.toarray() if sparse.issparse(added) else np.asarray(added)
+            total = base[None, :] + added.T
+            result = total if result is None else np.maximum(result, total)
+        return result
+
+    def to_frame(
+            self,
+            result : np.ndarray,
+    ) -> pd.DataFrame:
+        '''evaluate() output as a scenarios by zone pairs frame
+        '''
+        return pd.DataFrame(result, columns=self.pairs)
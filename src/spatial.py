@@ -0,0 +1,206 @@
+'''
+
+    spatial.py
+
+    Spatial indexes over node geometry
+
+'''
+
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+
+from .geometry import unit_vectors, line_length, split_antimeridian
+
+
+class NodeLocator:
+    '''Assigns points to the node whose polygon contains them
+
+    Node polygons of GEOMETRY are held in a shapely STRtree, built once, and
+    points are located in chunks so memory does not grow with the number of
+    points. Points outside every polygon (e.g. offshore) fall back to the node
+    of the nearest polygon within max_distance degrees, found in the same
+    STRtree, and beyond that to the node with the nearest centroid, found with
+    a KD-tree over unit vectors, which orders points like great-circle
+    distance.
+    '''
+
+    def __init__(
+            self,
+            nodes,
+            geometry,
+    ):
+        '''nodes: NodeRegistry
+        geometry: GEOMETRY table with a node_id column
+        '''
+        import shapely
+        from scipy.spatial import cKDTree
+
+        self.nodes = nodes
+
+        known = geometry['node_id'].to_numpy() >= 0
+        self._ids = geometry['node_id'].to_numpy()[known].astype(np.int32)
+        self.tree = shapely.STRtree(geometry.geometry.to_numpy()[known])
+
+        # nodes without coordinates cannot be the nearest node
+        located = np.flatnonzero(~np.isnan(nodes.lon) & ~np.isnan(nodes.lat))
+        self._nearest_ids = located.astype(np.int32)
+        self._nearest_tree = cKDTree(unit_vectors(nodes.lon[located], nodes.lat[located]))
+
+    def locate(
+            self,
+            lon,
+            lat,
+            nearest=True,
+            max_distance=5.0,
+            chunk_size=100_000,
+    ) -> np.ndarray:
+        '''Registry ids of the nodes containing each point
+
+        Points on a shared border go to the first matching polygon. Points
+        in no polygon get the node of the nearest polygon within max_distance
+        degrees (None for no limit), else that of the nearest centroid, or -1
+        if nearest is False.
+        '''
+        import shapely
+
+        lon = np.asarray(lon, dtype=float).ravel()
+        lat = np.asarray(lat, dtype=float).ravel()
+        if lon.shape != lat.shape:
+            raise ValueError('lon and lat must have the same length')
+
+        ids = np.full(len(lon), -1, dtype=np.int32)
+        for start in range(0, len(lon), chunk_size):
+            stop = start + chunk_size
+            points = shapely.points(lon[start:stop], lat[start:stop])
+
+            # (point, polygon) hits, keeping the first polygon of each point
+            point, polygon = self.tree.query(points, predicate='intersects')
+            point, first = np.unique(point, return_index=True)
+            chunk = ids[start:stop]
+            chunk[point] = self._ids[polygon[first]]
+
+            if nearest:
+                missing = np.flatnonzero((chunk < 0) & ~np.isnan(lon[start:stop]) & ~np.isnan(lat[start:stop]))
+                if len(missing):
+                    # nearest polygon, e.g. the coast of the country offshore points are off
+                    point, polygon = self.tree.query_nearest(points[missing], max_distance=max_distance)
+                    point, first = np.unique(point, return_index=True)
+                    chunk[missing[point]] = self._ids[polygon[first]]
+                    missing = missing[chunk[missing] < 0]
+                if len(missing):
+                    # far from any polygon, nearest centroid
+                    xyz = unit_vectors(lon[start:stop][missing], lat[start:stop][missing])
+                    _, hit = self._nearest_tree.query(xyz)
+                    chunk[missing] = self._nearest_ids[hit]
+        return ids
+
+    def locate_nodes(
+            self,
+            lon,
+            lat,
+            **kwargs,
+    ) -> np.ndarray:
+        '''Node names of the nodes containing each point, None where not found
+        '''
+        ids = self.locate(lon, lat, **kwargs)
+        return np.where(ids >= 0, self.nodes.node[ids], None)
+
+
+def border_adjacency(
+        nodes,
+        geometry,
+) -> sparse.csr_matrix:
+    '''Symmetric node by node matrix of shared border lengths (km)
+
+    Candidate neighbours come from an STRtree query of the node polygons
+    against themselves, so only polygons with overlapping bounds are compared;
+    the border is the intersection of their boundaries. Polygons meeting at a
+    single point are not neighbours.
+    '''
+    import shapely
+
+    known = geometry['node_id'].to_numpy() >= 0
+    ids = geometry['node_id'].to_numpy()[known]
+    polygons = geometry.geometry.to_numpy()[known]
+
+    # each unordered pair of touching polygons once
+    i, j = shapely.STRtree(polygons).query(polygons, predicate='intersects')
+    keep = (i < j) & (ids[i] != ids[j])
+    i, j = i[keep], j[keep]
+
+    boundaries = shapely.boundary(polygons)
+    length = line_length(shapely.intersection(boundaries[i], boundaries[j]))
+    keep = length > 0
+    f, t, length = ids[i][keep], ids[j][keep], length[keep]
+
+    n = len(nodes)
+    adjacency = sparse.coo_matrix(
+        (np.concatenate([length, length]), (np.concatenate([f, t]), np.concatenate([t, f]))),
+        shape=(n, n),
+    ).tocsr()
+    adjacency.sum_duplicates()
+    return adjacency
+
+
+def check_links(
+        adjacency : sparse.csr_matrix,
+        capacity : sparse.csr_matrix,
+        nodes,
+) -> pd.DataFrame:
+    '''Node pairs that border each other or are linked, one row per
+    unordered pair, with border length (km) and whether a link exists
+
+    Bordering pairs without a link are candidates for missing links; linked
+    pairs without a border are subsea or long distance links.
+    '''
+    linked = sparse.triu(capacity + capacity.T, k=1).tocsr()
+    linked.data[:] = 1
+    border = sparse.triu(adjacency, k=1).tocsr()
+
+    # union of both patterns, with explicit entries for every pair
+    union = (border + linked).tocoo()
+    i, j = union.row, union.col
+    return pd.DataFrame({
+        'from' : nodes.node[i],
+        'to' : nodes.node[j],
+        'border (km)' : np.asarray(border[i, j]).ravel(),
+        'linked' : np.asarray(linked[i, j]).ravel() > 0,
+    }).sort_values(['from','to'], ignore_index=True)
+
+
+def classify_pathways(
+        link_geometry,
+        geometry,
+        min_subsea_km=50,
+) -> pd.DataFrame:
+    '''Land or subsea pathway of every link from its great-circle arc
+
+    Arcs of LINK_GEOMETRY are intersected with the GEOMETRY land polygons
+    they hit, found with an STRtree query, in one vectorized pass. The length
+    of each arc outside all polygons is its estimated subsea length, and links
+    with more than min_subsea_km of it are subsea.
+    '''
+    import shapely
+
+    arcs = split_antimeridian(link_geometry.geometry.to_numpy())
+    polygons = geometry.geometry.to_numpy()
+    length = line_length(arcs)
+
+    # length of each arc over land, from (arc, polygon) hits
+    arc, polygon = shapely.STRtree(polygons).query(arcs, predicate='intersects')
+    overland = line_length(shapely.intersection(arcs[arc], polygons[polygon]))
+    land = np.minimum(np.bincount(arc, weights=overland, minlength=len(arcs)), length)
+
+    subsea = length - land
+    return pd.DataFrame({
+        'from' : link_geometry['from'].to_numpy(),
+        'to' : link_geometry['to'].to_numpy(),
+        'from_id' : link_geometry['from_id'].to_numpy(),
+        'to_id' : link_geometry['to_id'].to_numpy(),
+        'length (km)' : length,
+        'land (km)' : land,
+        'subsea (km)' : subsea,
+        'pathway' : np.where(subsea > min_subsea_km, 'subsea', 'land'),
+    })
@@ -0,0 +1,104 @@
+'''
+
+    timeline.py
+
+    Year-indexed capacity pathway of the network
+
+'''
+
+import numpy as np
+import pandas as pd
+
+from .network import zone_codes, zoning_key
+from .scenarios import link_incidence, zone_pairs
+
+
+class CapacityTimeline:
+    '''Capacity of every link in every year from start to horizon
+
+    Existing capacity is present from the start year. Planned capacity is
+    added in its 'year planned' (or start, if earlier) and kept thereafter;
+    additions planned after the horizon are left out. Undated planned
+    capacity is added in undated_year, or never if it is None.
+
+    All years are built in one pass: additions are placed in their year and
+    rolled forward with a cumulative sum over the year axis.
+    '''
+
+    def __init__(
+            self,
+            db,
+            start=2023,
+            horizon=2050,
+            undated_year=None,
+    ):
+        if horizon < start:
+            raise ValueError('horizon must not be before start')
+
+        self.db = db
+        self.years = pd.Index(np.arange(start, horizon + 1), name='year')
+
+        # links are DATABASE rows with known nodes
+        df = db.DATABASE
+        f = df['from'].cat.codes.to_numpy()
+        t = df['to'].cat.codes.to_numpy()
+        valid = (f >= 0) & (t >= 0)
+        self._from, self._to = f[valid], t[valid]
+        df = df[valid]
+        self.links = pd.MultiIndex.from_arrays(
+            [df['from'].astype(str), df['to'].astype(str)], names=['from','to'],
+        )
+
+        # year index of each planned addition, -1 if it never comes online
+        year = df['year planned'].to_numpy(dtype=float)
+        if undated_year is not None:
+            year = np.where(np.isnan(year), undated_year, year)
+        offset = np.clip(year - start, 0, None)
+        offset = np.where(np.isnan(offset) | (offset > horizon - start), -1, offset).astype(int)
+        online = np.flatnonzero(offset >= 0)
+
+        self.capacity = {}
+        for direction in ['+', '-']:
+            existing = df[f'existing capacity {direction} (mw)'].abs().fillna(0).to_numpy()
+            planned = df[f'planned capacity {direction} (mw)'].abs().fillna(0).to_numpy()
+
+            additions = np.zeros((len(self.years), len(df)))
+            additions[offset[online], online] = planned[online]
+            self.capacity[direction] = existing[None, :] + np.cumsum(additions, axis=0)
+
+        self._aggregates = {}
+
+    def to_frame(self) -> pd.DataFrame:
+        '''Capacity (MW) of every (year, link) in long format
+        '''
+        n_years, n_links = self.capacity['+'].shape
+        index = pd.MultiIndex.from_arrays([
+            np.repeat(self.years, n_links),
+            np.tile(self.links.get_level_values('from'), n_years),
+            np.tile(self.links.get_level_values('to'), n_years),
+        ], names=['year','from','to'])
+        return pd.DataFrame({
+            'capacity + (mw)' : self.capacity['+'].ravel(),
+            'capacity - (mw)' : self.capacity['-'].ravel(),
+        }, index=index)
+
+    def aggregate(
+            self,
+            by='subregion',
+    ) -> pd.DataFrame:
+        '''Interregional capacity (MW) per year (rows) and zone pair (columns),
+        aggregated like get_interregional_capacity; cached per zoning, keyed
+        by the zone of each node so edited mappings are not served stale
+        '''
+        codes, zones = zone_codes(self.db.NODES, by)
+        key = by if isinstance(by, str) else zoning_key(codes, zones)
+        if key not in self._aggregates:
+            pairs = zone_pairs(codes, self._from, self._to)
+            Q = link_incidence(codes, pairs, self._from, self._to)
+            agg = np.maximum(
+                np.asarray((Q.T @ self.capacity['+'].T).T),
+                np.asarray((Q.T @ self.capacity['-'].T).T),
+            )
+            columns = pd.MultiIndex.from_arrays([zones[pairs[:, 0]], zones[pairs[:, 1]]], names=['from','to'])
+            self._aggregates[key] = pd.DataFrame(agg, index=self.years, columns=columns)
+        return self._aggregates[key].copy()
@@ -0,0 +1,210 @@
+'''
+
+    topology.py
+
+    TopoJSON encoding of node geometry with shared boundaries
+
+'''
+
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def _rings(geometry):
+    '''Feature of each polygon, polygon of each ring, and ring coordinates
+    with the ring of each, exterior rings first
+    '''
+    import shapely
+
+    polygons, feature = shapely.get_parts(np.asarray(geometry), return_index=True)
+    rings, ring_polygon = shapely.get_rings(polygons, return_index=True)
+    coords, ring = shapely.get_coordinates(rings, return_index=True)
+    return feature, ring_polygon, coords, ring
+
+
+def to_topojson(
+        geometry,
+        properties=None,
+        quantization=100_000,
+        step=None,
+        name='nodes',
+) -> dict:
+    '''Encode polygon geometries as a TopoJSON topology
+
+    Coordinates are quantized to a quantization by quantization grid over
+    the bounding box and rings are cut into arcs wherever the set of rings
+    sharing a segment changes, so every shared border is stored once. Arcs
+    are delta encoded.
+
+    geometry: GeoSeries or array of (multi)polygons, one per feature
+    properties: DataFrame of feature properties, aligned with geometry
+    step: grid spacing to quantize to instead, for coordinates already
+    snapped to a grid (e.g. simplified levels)
+    '''
+    geometry = np.asarray(geometry)
+    feature, ring_polygon, coords, ring = _rings(geometry)
+
+    # quantize to integer positions
+    x0, y0 = coords.min(axis=0)
+    x1, y1 = coords.max(axis=0)
+    if step is not None:
+        kx = ky = step
+        x0, y0 = np.floor(x0 / step) * step, np.floor(y0 / step) * step
+        quantization = int(np.ceil(max(x1 - x0, y1 - y0) / step)) + 1
+    else:
+        kx = (x1 - x0) / (quantization - 1) if x1 > x0 else 1
+        ky = (y1 - y0) / (quantization - 1) if y1 > y0 else 1
+    q = np.round((coords - [x0, y0]) / [kx, ky]).astype(np.int64)
+
+    # drop repeated positions within each ring
+    keep = np.concatenate([[True], (ring[1:] != ring[:-1]) | (q[1:] != q[:-1]).any(axis=1)])
+    q, ring = q[keep], ring[keep]
+    key = q[:, 0] * quantization + q[:, 1]
+
+    # segments of each ring, one per position except the closing one
+    last = np.concatenate([ring[1:] != ring[:-1], [True]])
+    start = np.flatnonzero(~last)
+    a, b = key[start], key[start + 1]
+    segment = np.unique(np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1), axis=0, return_inverse=True)[1].ravel()
+
+    # rings sharing each segment, summarised as (first, last, count)
+    seg_ring = ring[start]
+    n_seg = segment.max() + 1 if len(segment) else 0
+    count = np.bincount(segment, minlength=n_seg)
+    first = np.full(n_seg, np.iinfo(np.int64).max)
+    np.minimum.at(first, segment, seg_ring)
+    final = np.full(n_seg, -1)
+    np.maximum.at(final, segment, seg_ring)
+    signature = np.stack([first[segment], final[segment], count[segment]], axis=1)
+
+    # cut rings into arcs where the signature changes, stored once each
+    arcs, index = [], {}
+    def add_arc(points):
+        k = tuple(points[:, 0] * quantization + points[:, 1])
+        if k in index:
+            return index[k]
+        if k[::-1] in index:
+            return ~index[k[::-1]]
+        index[k] = len(arcs)
+        arcs.append(points)
+        return index[k]
+
+    bounds = np.flatnonzero(np.concatenate([[True], seg_ring[1:] != seg_ring[:-1], [True]]))
+    ring_arcs = {}
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        r = seg_ring[lo]
+        sig = signature[lo:hi]
+        points = q[start[lo:hi]]
+        m = len(points)
+        if m < 3:
+            continue
+
+        cuts = np.flatnonzero((sig != np.roll(sig, 1, axis=0)).any(axis=1))
+        if not len(cuts):
+            # whole ring is one arc, start at its smallest position so rings
+            # shared without junctions (e.g. enclaves) match
+            k = points[:, 0] * quantization + points[:, 1]
+            cuts = np.array([k.argmin()])
+
+        # rotate to start at a cut and close the ring
+        points = np.roll(points, -cuts[0], axis=0)
+        points = np.concatenate([points, points[:1]])
+        cuts = np.append(cuts - cuts[0], m)
+        ring_arcs[r] = [add_arc(points[c:d + 1]) for c, d in zip(cuts[:-1], cuts[1:])]
+
+    # geometry objects, polygons as lists of ring arcs, dropping polygons
+    # whose exterior collapsed
+    exterior = np.concatenate([[True], ring_polygon[1:] != ring_polygon[:-1]])
+    polygons = {}
+    for r in sorted(ring_arcs):
+        if exterior[r] or ring_polygon[r] in polygons:
+            polygons.setdefault(ring_polygon[r], []).append(ring_arcs[r])
+    features = {}
+    for p, rings in polygons.items():
+        features.setdefault(feature[p], []).append(rings)
+
+    geometries = []
+    for i in range(len(geometry)):
+        parts = features.get(i, [])
+        if not parts:
+            obj = {'type' : None}
+        elif len(parts) == 1:
+            obj = {'type' : 'Polygon', 'arcs' : parts[0]}
+        else:
+            obj = {'type' : 'MultiPolygon', 'arcs' : parts}
+        if properties is not None:
+            row = properties.iloc[i]
+            obj['id'] = str(properties.index[i])
+            # missing values as null, JSON has no NaN
+            obj['properties'] = {k : (None if pd.isna(v) else v.item() if hasattr(v, 'item') else v) for k, v in row.items()}
+        geometries.append(obj)
+
+    return {
+        'type' : 'Topology',
+        'transform' : {'scale' : [float(kx), float(ky)], 'translate' : [float(x0), float(y0)]},
+        'objects' : {name : {'type' : 'GeometryCollection', 'geometries' : geometries}},
+        'arcs' : [
+            np.concatenate([p[:1], np.diff(p, axis=0)]).tolist() for p in arcs
+        ],
+    }
+
+
+def to_geojson(
+        topology : dict,
+        name='nodes',
+        properties=True,
+) -> dict:
+    '''Decode an object of a topology to a GeoJSON FeatureCollection, with
+    or without feature properties
+
+    Coordinates are rounded to the decimals of the quantization step, so the
+    GeoJSON carries no more digits than the topology resolves.
+    '''
+    scale = np.asarray(topology['transform']['scale'])
+    translate = np.asarray(topology['transform']['translate'])
+    digits = int(np.ceil(np.round(-np.log10(scale.min()), 6)))
+    arcs = [
+        np.round(np.cumsum(np.asarray(a, dtype=float).reshape(-1, 2), axis=0) * scale + translate, digits)
+        for a in topology['arcs']
+    ]
+
+    def ring(ids):
+        coords = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in ids]
+        coords = [coords[0]] + [c[1:] for c in coords[1:]]
+        return np.concatenate(coords).tolist()
+
+    features = []
+    for obj in topology['objects'][name]['geometries']:
+        if obj['type'] is None:
+            geometry = None
+        elif obj['type'] == 'Polygon':
+            geometry = {'type' : 'Polygon', 'coordinates' : [ring(r) for r in obj['arcs']]}
+        else:
+            geometry = {'type' : 'MultiPolygon', 'coordinates' : [[ring(r) for r in p] for p in obj['arcs']]}
+        feature = {
+            'type' : 'Feature',
+            'geometry' : geometry,
+            'properties' : obj.get('properties', {}) if properties else {},
+        }
+        if 'id' in obj:
+            feature['id'] = obj['id']
+        features.append(feature)
+
+    return {'type' : 'FeatureCollection', 'features' : features}
+
+
+def write_topojson(
+        topology : dict,
+        path,
+):
+    '''Write a topology as compact JSON
+    '''
+    with open(path, 'w') as f:
+        json.dump(topology, f, separators=(',', ':'), allow_nan=False)
+
+
+def read_topojson(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
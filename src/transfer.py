@@ -0,0 +1,209 @@
+'''
+
+    transfer.py
+
+    Transfer capability between nodes and zones via max-flow / min-cut
+
+'''
+
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+from scipy.sparse.csgraph import breadth_first_order, maximum_flow
+
+from .network import TransmissionNetwork, zone_codes, zoning_key
+
+
+def solve_max_flow(
+        capacity : sparse.csr_matrix,
+        sources : np.ndarray,
+        sinks : np.ndarray,
+        return_cut=False,
+):
+    '''Max flow (MW) from a set of source nodes to a set of sink nodes
+
+    A super source feeding every source node and a super sink drained by every
+    sink node are appended to the integer capacity matrix, linked with more
+    capacity than the whole network so they never appear in the cut. With
+    return_cut the nodes on the source side of the minimum cut are returned as
+    a boolean mask too.
+    '''
+    n = capacity.shape[0]
+    if len(sources) == 0 or len(sinks) == 0:
+        return (0.0, np.zeros(n, dtype=bool)) if return_cut else 0.0
+
+    unbounded = int(capacity.data.sum()) + 1
+    s, t = n, n + 1
+
+    rows = np.concatenate([
+        np.repeat(np.arange(n), np.diff(capacity.indptr)), np.full(len(sources), s), sinks,
+    ])
+    cols = np.concatenate([capacity.indices, sources, np.full(len(sinks), t)])
+    data = np.concatenate([capacity.data, np.full(len(sources) + len(sinks), unbounded)])
+    graph = sparse.csr_matrix(
+        (data.astype(np.int32), (rows, cols)), shape=(n + 2, n + 2),
+    )
+
+    result = maximum_flow(graph, s, t, method='dinic')
+    if not return_cut:
+        return float(result.flow_value)
+
+    # source side of the cut: nodes reachable through positive residual capacity
+    residual = (graph - result.flow).tocsr()
+    residual.data[residual.data < 0] = 0
+    residual.eliminate_zeros()
+    reachable = np.zeros(n + 2, dtype=bool)
+    reachable[breadth_first_order(residual, s, return_predecessors=False)] = True
+    return float(result.flow_value), reachable[:n]
+
+
+# per process state of pool workers, set once by _init_worker
+_WORKER = {}
+
+
+def _init_worker(capacity, codes):
+    _WORKER['capacity'] = capacity
+    _WORKER['codes'] = codes
+
+
+def _solve_pairs(pairs):
+    capacity, codes = _WORKER['capacity'], _WORKER['codes']
+    return [
+        solve_max_flow(capacity, np.flatnonzero(codes == a), np.flatnonzero(codes == b))
+        for a, b in pairs
+    ]
+
+
+class TransferCapability:
+    '''Maximum transferable power (MW) between nodes or zones of a network
+
+    Uses the directional capacities of TransmissionNetwork.matrix(status),
+    rounded to whole MW, and allows flows to route through third nodes.
+    Results are cached per (zoning, source, sink).
+    '''
+
+    def __init__(
+            self,
+            network : TransmissionNetwork,
+            status='existing',
+    ):
+        self.network = network
+        self.status = status
+        self.capacity = network.matrix(status, 'both').copy()
+        self.capacity.data = np.rint(self.capacity.data)
+        self.capacity = self.capacity.astype(np.int32)
+        self._results = {}
+
+    def zoning(self, mapping):
+        '''Zone codes, labels and a cache key of a mapping, None means nodes
+        '''
+        if mapping is None:
+            n = len(self.network)
+            return np.arange(n), pd.Index(self.network.nodes.node, name='zone'), 'node'
+        codes, labels = zone_codes(self.network.nodes, mapping)
+        return codes, labels, zoning_key(codes, labels)
+
+    def zone_code(self, labels, zone, mapping):
+        '''Code of a zone label, or of a node name or id when mapping is None
+        '''
+        if mapping is None:
+            return self.network.node_id(zone)
+        loc = labels.get_indexer([zone])[0]
+        if loc < 0:
+            raise KeyError(f'Unknown zone {zone!r}')
+        return loc
+
+    def max_flow(
+            self,
+            source,
+            sink,
+            mapping=None,
+    ) -> float:
+        '''Max transfer from source to sink, nodes or zones of mapping, see
+        network.zone_codes
+        '''
+        codes, labels, key = self.zoning(mapping)
+        a, b = self.zone_code(labels, source, mapping), self.zone_code(labels, sink, mapping)
+        if a == b:
+            raise ValueError('Source and sink must differ')
+
+        if (key, a, b) not in self._results:
+            self._results[(key, a, b)] = solve_max_flow(
+                self.capacity, np.flatnonzero(codes == a), np.flatnonzero(codes == b),
+            )
+        return self._results[(key, a, b)]
+
+    def min_cut(
+            self,
+            source,
+            sink,
+            mapping=None,
+    ) -> pd.DataFrame:
+        '''Links of the minimum cut between source and sink, whose capacities
+        sum to the max flow
+        '''
+        codes, labels, _ = self.zoning(mapping)
+        a, b = self.zone_code(labels, source, mapping), self.zone_code(labels, sink, mapping)
+        if a == b:
+            raise ValueError('Source and sink must differ')
+
+        _, reachable = solve_max_flow(
+            self.capacity, np.flatnonzero(codes == a), np.flatnonzero(codes == b), return_cut=True,
+        )
+
+        m = self.capacity.tocoo()
+        cut = reachable[m.row] & ~reachable[m.col]
+        return pd.DataFrame({
+            'from' : self.network.nodes.node[m.row[cut]],
+            'to' : self.network.nodes.node[m.col[cut]],
+            'capacity' : m.data[cut].astype(float),
+        }).sort_values(['from','to'], ignore_index=True)
+
+    def transfer_matrix(
+            self,
+            mapping,
+            zones=None,
+            workers=None,
+            chunksize=64,
+    ) -> pd.DataFrame:
+        '''Max transfer between every ordered pair of zones (or of the given
+        subset of zones), evaluated in a process pool
+
+        workers: number of processes, defaults to the cpu count, 1 runs in
+        this process. Cached pairs are not recomputed.
+        '''
+        codes, labels, key = self.zoning(mapping)
+        zones = labels if zones is None else pd.Index(zones)
+        ids = [self.zone_code(labels, z, mapping) for z in zones]
+
+        pairs = [(a, b) for a in ids for b in ids if a != b and (key, a, b) not in self._results]
+
+        workers = workers or os.cpu_count() or 1
+        if pairs and (workers == 1 or len(pairs) <= chunksize):
+            _init_worker(self.capacity, codes)
+            values = _solve_pairs(pairs)
+        elif pairs:
+            chunks = [pairs[i:i + chunksize] for i in range(0, len(pairs), chunksize)]
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(chunks)),
+                initializer=_init_worker,
+                initargs=(self.capacity, codes),
+            ) as pool:
+                values = [v for chunk in pool.map(_solve_pairs, chunks) for v in chunk]
+        else:
+            values = []
+
+        for pair, v in zip(pairs, values):
+            self._results[(key, *pair)] = v
+
+        df = pd.DataFrame(0.0, index=pd.Index(zones, name='from'), columns=pd.Index(zones, name='to'))
+        for i, a in enumerate(ids):
+            for j, b in enumerate(ids):
+                if a != b:
+                    df.iat[i, j] = self._results[(key, a, b)]
+        return df
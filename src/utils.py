@@ -6,9 +6,76 @@
 
 '''
 
+import contextlib
+import functools
+import hashlib
+import os
+import threading
+import warnings
+
+from pathlib import Path
+
 import pandas as pd
 
 def strip_xx_from_node(
         nodes : pd.Series,
 ) -> pd.Series:
-    return nodes.str.replace('-XX','')
\ No newline at end of file
+    return nodes.str.replace('-XX','')
+
+def normalize_node_names(
+        nodes : pd.Series,
+) -> pd.Series:
+    '''Workbook node names to node ids, e.g. AFG -> AFG-XX, CHNXI -> CHN-XI
+    '''
+    length = nodes.str.len()
+    suffix = nodes.str[3:6].mask(length == 3, 'XX')
+    return nodes.mask(length >= 3, nodes.str[0:3] + '-' + suffix)
+
+def hash_files(
+        paths : list,
+        salt : str = '',
+) -> str:
+    '''Content hash of a list of files, missing files are hashed by name only
+    '''
+    h = hashlib.sha256(salt.encode())
+    for path in paths:
+        path = Path(path)
+        h.update(path.name.encode())
+        if path.is_file():
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+    return h.hexdigest()[:16]
+
+@functools.cache
+def code_version() -> str:
+    '''Content hash of the package source files, for caches of outputs that
+    depend on the code
+    '''
+    return hash_files(sorted(Path(__file__).parent.glob('*.py')))
+
+def write_atomic(
+        path,
+        write,
+        stale : str = None,
+):
+    '''Write a file with write(tmp_path) to a temporary file next to path
+    and move it into place, so readers never see partial files, then remove
+    other files of the directory matching the glob stale. Warns instead of
+    raising if the file cannot be written.
+    '''
+    path = Path(path)
+    # keep the suffix, e.g. scipy's save_npz appends .npz to names without it
+    tmp = path.with_name(f'.{path.stem}-{os.getpid()}-{threading.get_ident()}{path.suffix}')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write(tmp)
+        os.replace(tmp, path)
+        if stale is not None:
+            for old in path.parent.glob(stale):
+                if old != path:
+                    old.unlink(missing_ok=True)
+    except OSError as e:
+        with contextlib.suppress(OSError):
+            tmp.unlink(missing_ok=True)
+        warnings.warn(f'Could not write cache file {path}: {e}')
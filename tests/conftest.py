@@ -0,0 +1,63 @@
+'''
+
+    conftest.py
+
+    Shared fixtures: the database of data/, synthetic node polygons and
+    topology helpers
+
+'''
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.database import GlobalTransmissionDatabase
+
+DATA_DIR = Path(__file__).resolve().parents[1] / 'data'
+
+
+@pytest.fixture(scope='session')
+def db():
+    '''Database of data/, loaded without the parquet cache
+    '''
+    if not (DATA_DIR / 'global_transmission_data.xlsx').is_file():
+        pytest.skip('data/global_transmission_data.xlsx not found')
+    return GlobalTransmissionDatabase(DATA_DIR, use_cache=False)
+
+
+@pytest.fixture(scope='session')
+def cells():
+    '''Voronoi cells with wiggly shared borders, like node polygons
+
+    All vertices are moved by one smooth, invertible displacement field, so
+    neighbouring cells keep identical borders.
+    '''
+    import geopandas as gpd
+    import shapely
+
+    rng = np.random.default_rng(0)
+    points = shapely.multipoints(rng.uniform(0, 20, (60, 2)))
+    polygons = shapely.get_parts(shapely.voronoi_polygons(points, extend_to=shapely.box(0, 0, 20, 20)))
+    polygons = shapely.clip_by_rect(polygons, 0, 0, 20, 20)
+    polygons = shapely.segmentize(polygons, 0.02)
+    polygons = shapely.transform(polygons, lambda c: c + 0.2 * np.sin(3 * c[:, ::-1]))
+    return gpd.GeoDataFrame({'cell' : np.arange(len(polygons))}, geometry=polygons)
+
+
+def _arc_features(topology, name='nodes'):
+    '''Features using each arc of a topology
+    '''
+    used = {}
+    for i, obj in enumerate(topology['objects'][name]['geometries']):
+        polygons = [obj['arcs']] if obj['type'] == 'Polygon' else obj.get('arcs', [])
+        for rings in polygons:
+            for ring in rings:
+                for arc in ring:
+                    used.setdefault(arc if arc >= 0 else ~arc, set()).add(i)
+    return used
+
+
+@pytest.fixture(scope='session')
+def arc_features():
+    return _arc_features
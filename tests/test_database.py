@@ -0,0 +1,69 @@
+'''
+
+    test_database.py
+
+    Loading and caching of database tables
+
+'''
+
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.database import GlobalTransmissionDatabase
+
+
+@pytest.fixture
+def data_dir(db, tmp_path):
+    '''Copy of the workbook and node tables of data/, with an empty cache
+    '''
+    for path in ['global_transmission_data.xlsx', 'csv/nodes.csv', 'csv/iso_codes.csv']:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(db.data_dir / path, tmp_path / path)
+    return tmp_path
+
+
+def test_codes_are_registry_ids(db):
+    df = db.DATABASE
+    for c in ['from','to']:
+        assert list(df[c].cat.categories) == list(db.NODES.nodes)
+        codes = df[c].cat.codes.to_numpy()
+        known = codes >= 0
+        np.testing.assert_array_equal(codes[known], db.NODES.ids(df[c][known].astype(str)))
+
+
+def test_warm_cache_matches_cold_load(data_dir, monkeypatch):
+    cold = GlobalTransmissionDatabase(data_dir)
+    expected = cold.DATABASE
+    assert len(list((data_dir / 'cache').glob('DATABASE-*.parquet'))) == 1
+
+    # a warm start reads the cache without parsing the workbook
+    warm = GlobalTransmissionDatabase(data_dir)
+    monkeypatch.setattr(warm, '_load_database', lambda: pytest.fail('workbook parsed on a warm start'))
+    pd.testing.assert_frame_equal(warm.DATABASE, expected)
+    for c in ['from','to']:
+        np.testing.assert_array_equal(warm.DATABASE[c].cat.codes, expected[c].cat.codes)
+    pd.testing.assert_frame_equal(
+        warm.get_interregional_capacity('region'), cold.get_interregional_capacity('region'),
+    )
+
+
+def test_stale_cache_is_replaced(data_dir):
+    GlobalTransmissionDatabase(data_dir).DATABASE
+    with open(data_dir / 'csv' / 'iso_codes.csv', 'a') as f:
+        f.write('\n')
+
+    GlobalTransmissionDatabase(data_dir).DATABASE
+    assert len(list((data_dir / 'cache').glob('DATABASE-*.parquet'))) == 1
+
+
+def test_replaced_database_changes_version(data_dir):
+    db = GlobalTransmissionDatabase(data_dir, use_cache=False)
+    version = db.database_version
+    assert version == db.data_version
+
+    db.DATABASE = db.DATABASE.iloc[:100]
+    assert db.database_version != version
+    assert len(db.get_region('Europe')['links']) <= 100
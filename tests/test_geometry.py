@@ -0,0 +1,70 @@
+'''
+
+    test_geometry.py
+
+    Simplified geometry pyramid
+
+'''
+
+import numpy as np
+import pytest
+
+from src.geometry import SIMPLIFY_TOLERANCES, grid_precision, simplify_geometry
+from src.topology import to_topojson
+
+
+@pytest.fixture(scope='module')
+def pyramid(cells):
+    return simplify_geometry(cells)
+
+
+def test_levels(cells, pyramid):
+    import shapely
+
+    assert sorted(pyramid['tolerance'].unique()) == sorted(SIMPLIFY_TOLERANCES)
+    for tolerance, level in pyramid.groupby('tolerance'):
+        assert level['cell'].tolist() == cells['cell'].tolist()
+
+        # coordinates on the grid of the level
+        coords = shapely.get_coordinates(level.geometry.to_numpy())
+        digits = grid_precision(tolerance)
+        assert np.allclose(coords, np.round(coords, digits))
+
+
+def test_levels_valid_without_overlaps(cells, pyramid):
+    import shapely
+
+    outline = shapely.union_all(cells.geometry.to_numpy())
+    for tolerance, level in pyramid.groupby('tolerance'):
+        shapes = level.geometry.to_numpy()
+        assert shapely.is_valid(shapes).all()
+        assert not shapely.is_empty(shapes).any()
+
+        # no overlaps between neighbours, and no gaps beyond the outline
+        union = shapely.union_all(shapes)
+        assert shapely.area(shapes).sum() == pytest.approx(union.area, rel=1e-9)
+        assert union.area == pytest.approx(outline.area, rel=tolerance)
+
+
+def test_levels_keep_shared_borders(cells, pyramid, arc_features):
+    def shared(geometry, step=None):
+        used = arc_features(to_topojson(geometry, step=step))
+        return np.mean([len(f) > 1 for f in used.values()])
+
+    full = shared(cells.geometry)
+    for tolerance, level in pyramid.groupby('tolerance'):
+        assert shared(level.geometry, 10.0 ** -grid_precision(tolerance)) == pytest.approx(full, abs=0.02)
+
+
+def test_invalid_shapes_are_repaired():
+    import geopandas as gpd
+    import shapely
+
+    # overlapping parts, and a bow tie
+    shapes = [
+        shapely.MultiPolygon([shapely.box(0, 0, 1, 1), shapely.box(0.5, 0.5, 1.5, 1.5)]),
+        shapely.Polygon([(0, 0), (1, 1), (1, 0), (0, 1)]),
+        shapely.box(2, 2, 3, 3),
+    ]
+    pyramid = simplify_geometry(gpd.GeoDataFrame({'cell' : [0, 1, 2]}, geometry=shapes))
+    assert shapely.is_valid(pyramid.geometry.to_numpy()).all()
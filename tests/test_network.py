@@ -0,0 +1,94 @@
+'''
+
+    test_network.py
+
+    Widest paths and max-flow transfer capability against networkx
+
+'''
+
+import heapq
+
+import numpy as np
+import pytest
+
+nx = pytest.importorskip('networkx')
+
+
+def _graph(matrix):
+    '''Directed networkx graph of a sparse capacity matrix
+    '''
+    m = matrix.tocoo()
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(m.shape[0]))
+    graph.add_weighted_edges_from(zip(m.row.tolist(), m.col.tolist(), m.data.tolist()), weight='capacity')
+    return graph
+
+
+def _widest(graph, source):
+    '''Bottleneck capacity of the widest path from source to every node, by
+    Dijkstra with max-min in place of sum
+    '''
+    width = {source : np.inf}
+    heap = [(-np.inf, source)]
+    done = set()
+    while heap:
+        w, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        for v, edge in graph[u].items():
+            through = min(-w, edge['capacity'])
+            if through > width.get(v, 0):
+                width[v] = through
+                heapq.heappush(heap, (-through, v))
+    return width
+
+
+@pytest.fixture(scope='module')
+def network(db):
+    return db.get_network()
+
+
+def test_widest_paths(db, network):
+    paths = db.get_widest_paths('existing')
+    graph = _graph(network.matrix('existing', 'both'))
+
+    rng = np.random.default_rng(0)
+    for source in rng.choice(len(network), 25, replace=False).tolist():
+        expected = np.zeros(len(network), dtype=np.float32)
+        for node, width in _widest(graph, source).items():
+            expected[node] = width
+        np.testing.assert_allclose(paths.width[source], expected, rtol=1e-6)
+
+        # the reconstructed path achieves the width
+        for sink in np.flatnonzero((expected > 0) & (expected < np.inf))[:5].tolist():
+            path = db.NODES.ids(paths.path(source, sink))
+            assert path[0] == source and path[-1] == sink
+            bottleneck = min(graph[a][b]['capacity'] for a, b in zip(path[:-1], path[1:]))
+            assert bottleneck == pytest.approx(expected[sink], rel=1e-6)
+
+
+def test_max_flow_between_nodes(db):
+    transfer = db.get_transfer_capability('existing')
+    graph = _graph(transfer.capacity)
+
+    rng = np.random.default_rng(0)
+    linked = np.flatnonzero(np.diff(transfer.capacity.indptr) > 0)
+    for source, sink in rng.choice(linked, (25, 2)).tolist():
+        if source == sink:
+            continue
+        expected = nx.maximum_flow_value(graph, source, sink, capacity='capacity')
+        assert transfer.max_flow(source, sink) == expected
+
+
+def test_max_flow_between_zones(db):
+    transfer = db.get_transfer_capability('existing')
+    codes, labels, _ = transfer.zoning('region')
+
+    for a, b in [(i, j) for i in range(len(labels)) for j in range(len(labels)) if i != j]:
+        # super source and sink without a capacity are unbounded in networkx
+        graph = _graph(transfer.capacity)
+        graph.add_edges_from(('s', int(i)) for i in np.flatnonzero(codes == a))
+        graph.add_edges_from((int(i), 't') for i in np.flatnonzero(codes == b))
+        expected = nx.maximum_flow_value(graph, 's', 't', capacity='capacity')
+        assert transfer.max_flow(labels[a], labels[b], mapping='region') == expected
@@ -0,0 +1,68 @@
+'''
+
+    test_topology.py
+
+    TopoJSON encoding round trip
+
+'''
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.topology import to_geojson, to_topojson, write_topojson
+
+
+def _decode(topology, **kwargs):
+    import shapely
+
+    features = to_geojson(topology, **kwargs)['features']
+    return np.array([shapely.from_geojson(json.dumps(f['geometry'])) for f in features])
+
+
+def test_round_trip(cells):
+    import shapely
+
+    topology = to_topojson(cells.geometry, quantization=1_000_000)
+    decoded = _decode(topology)
+    step = max(topology['transform']['scale'])
+
+    assert shapely.is_valid(decoded).all()
+    assert shapely.hausdorff_distance(decoded, cells.geometry.to_numpy()).max() < 2 * step
+
+
+def test_shared_borders_stored_once(cells, arc_features):
+    import shapely
+
+    topology = to_topojson(cells.geometry)
+    used = arc_features(topology)
+    assert max(len(f) for f in used.values()) <= 2
+
+    # every pair of bordering cells shares an arc; quantization may also
+    # join cells meeting at nearly one point
+    polygons = cells.geometry.to_numpy()
+    i, j = shapely.STRtree(polygons).query(polygons, predicate='intersects')
+    keep = i < j
+    i, j = i[keep], j[keep]
+    border = shapely.length(shapely.intersection(shapely.boundary(polygons[i]), shapely.boundary(polygons[j])))
+    neighbours = {(a, b) for a, b, length in zip(i, j, border) if length > 0}
+    shared = {tuple(sorted(f)) for f in used.values() if len(f) == 2}
+    assert neighbours and neighbours <= shared
+
+    # decoded neighbours have identical borders
+    decoded = _decode(topology)
+    for a, b in neighbours:
+        assert shapely.area(shapely.intersection(decoded[a], decoded[b])) == pytest.approx(0, abs=1e-9)
+
+
+def test_missing_properties_are_null(cells, tmp_path):
+    properties = pd.DataFrame({'REGION' : ['ANT'] + ['X'] * (len(cells) - 1), 'iso_region' : np.nan})
+    topology = to_topojson(cells.geometry, properties)
+    write_topojson(topology, tmp_path / 'nodes.topojson')
+
+    # strict JSON, as read by JSON.parse
+    text = (tmp_path / 'nodes.topojson').read_text()
+    features = json.loads(text, parse_constant=lambda c: pytest.fail(f'{c} in JSON'))['objects']['nodes']['geometries']
+    assert features[0]['properties'] == {'REGION' : 'ANT', 'iso_region' : None}
@@ -0,0 +1,48 @@
+'''
+
+    test_uncertainty.py
+
+    Monte Carlo percentile bands against exact percentiles of the draws
+
+'''
+
+import numpy as np
+import pytest
+
+from src.network import zone_codes
+from src.scenarios import link_incidence, zone_pairs
+from src.uncertainty import monte_carlo
+
+
+def test_percentiles_match_draws(db):
+    draws, bins, seed = 20_000, 2_000, 0
+    result = monte_carlo(db, by='region', status='existing', draws=draws, chunk_size=draws, bins=bins, seed=seed)
+
+    # the same draws, aggregated without histograms
+    df = db.DATABASE
+    f, t = df['from'].cat.codes.to_numpy(), df['to'].cat.codes.to_numpy()
+    valid = (f >= 0) & (t >= 0)
+    codes, _ = zone_codes(db.NODES, 'region')
+    Q = link_incidence(codes, zone_pairs(codes, f[valid], t[valid]), f[valid], t[valid])
+
+    plus = df.loc[valid, 'existing capacity + (mw)'].abs().fillna(0).to_numpy()
+    minus = df.loc[valid, 'existing capacity - (mw)'].abs().fillna(0).to_numpy()
+    lo, hi = np.minimum(plus, minus), np.maximum(plus, minus)
+    capacity = lo + np.random.default_rng(seed).random((draws, len(lo))) * (hi - lo)
+    agg = np.asarray((Q.T @ capacity.T).T)
+
+    np.testing.assert_allclose(result['mean'], agg.mean(axis=0), rtol=1e-9)
+    np.testing.assert_allclose(result['std'], agg.std(axis=0), rtol=1e-6, atol=1e-6)
+
+    # percentiles within one histogram bin
+    width = (hi @ Q - lo @ Q) / bins
+    for q in [5, 50, 95]:
+        assert (np.abs(result[f'p{q}'] - np.percentile(agg, q, axis=0)) <= width + 1e-9).all()
+
+
+def test_percentiles_ordered(db):
+    result = monte_carlo(db, by='subregion', draws=5_000, completion_probability=0.5)
+    assert (result['p5'] <= result['p50']).all() and (result['p50'] <= result['p95']).all()
+    assert (result['std'] >= 0).all()
+    with pytest.raises(ValueError):
+        monte_carlo(db, completion_probability=1.5, draws=10)